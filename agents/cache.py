@@ -0,0 +1,330 @@
+"""Semantic response cache for agent LLM calls."""
+from typing import List, Dict, Optional, Tuple, Callable
+from contextlib import aclosing
+import hashlib
+import os
+import threading
+import time
+import diskcache
+import numpy as np
+import orjson
+from dotenv import load_dotenv
+from ollama_client import (
+    achat_llm, achat_llm_stream, generate_persona_reactions_batch, get_async_client,
+    OLLAMA_BASE_URL, DEFAULT_MODEL, JSON_HEADERS
+)
+from agents.json_stream import JSONObjectScanner
+
+# Load environment variables
+load_dotenv()
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "True").lower() == "true"
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+LLM_CACHE_TTL = 7 * 24 * 60 * 60  # 7 days
+LLM_CACHE_SIMILARITY = float(os.getenv("LLM_CACHE_SIMILARITY", "0.92"))
+# Most embeddings kept per semantic index partition (oldest evicted first)
+LLM_CACHE_INDEX_SIZE = int(os.getenv("LLM_CACHE_INDEX_SIZE", "512"))
+EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+
+
+class SemanticCache:
+    """Exact-match disk cache backed by an in-memory cosine-similarity index."""
+
+    def __init__(
+        self,
+        directory: str = LLM_CACHE_DIR,
+        ttl: int = LLM_CACHE_TTL,
+        threshold: float = LLM_CACHE_SIMILARITY,
+        max_entries: int = LLM_CACHE_INDEX_SIZE
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            directory: Directory for the on-disk exact-match cache
+            ttl: Time-to-live in seconds for cached responses
+            threshold: Minimum cosine similarity for a semantic hit
+            max_entries: Most embeddings kept per index partition
+        """
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.store = diskcache.Cache(directory)
+        # One index per (model, system prompt) so agents never share answers;
+        # each row carries its insertion time so it expires with the store
+        self._index: Dict[str, Tuple[np.ndarray, List[str], np.ndarray]] = {}
+        # Streamlit sessions run on separate threads and share this cache
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(system: str, user: str, model: str) -> str:
+        """
+        Build the exact-match key for a prompt.
+
+        Args:
+            system: System prompt content
+            user: User message content
+            model: Model name the response was generated with
+
+        Returns:
+            SHA-256 hex digest of the prompt
+        """
+        return hashlib.sha256("\0".join((model, system, user)).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for an exact key, if any."""
+        return self.store.get(key)
+
+    def lookup(self, namespace: str, embedding: np.ndarray) -> Optional[str]:
+        """
+        Find the most similar cached response within a namespace.
+
+        Args:
+            namespace: Index partition (model + system prompt)
+            embedding: L2-normalized embedding of the user message
+
+        Returns:
+            Cached response if the top-1 similarity meets the threshold
+        """
+        with self._lock:
+            entry = self._index.get(namespace)
+        if entry is None:
+            return None
+
+        vectors, responses, inserted = entry
+        if vectors.shape[1] != embedding.shape[0]:
+            return None
+
+        # Inner product of normalized vectors == cosine similarity
+        scores = vectors @ embedding
+        # Rows past the TTL may linger until the next put; never serve them
+        scores[inserted < time.time() - self.ttl] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            return responses[best]
+        return None
+
+    def put(
+        self,
+        key: str,
+        response: str,
+        namespace: Optional[str] = None,
+        embedding: Optional[np.ndarray] = None
+    ) -> None:
+        """
+        Store a response in the exact-match cache and, optionally, the index.
+
+        Index rows older than the TTL are dropped on every write, and each
+        partition keeps at most ``max_entries`` of the newest rows.
+
+        Args:
+            key: Exact-match key from ``make_key``
+            response: LLM response to cache
+            namespace: Index partition (model + system prompt)
+            embedding: L2-normalized embedding of the user message
+        """
+        self.store.set(key, response, expire=self.ttl)
+
+        if namespace is None or embedding is None:
+            return
+
+        now = time.time()
+        with self._lock:
+            entry = self._index.get(namespace)
+            if entry is None or entry[0].shape[1] != embedding.shape[0]:
+                vectors = embedding[np.newaxis, :]
+                responses = [response]
+                inserted = np.array([now])
+            else:
+                vectors = np.vstack([entry[0], embedding])
+                responses = entry[1] + [response]
+                inserted = np.append(entry[2], now)
+
+            # Drop expired rows, then the oldest beyond the size bound
+            keep = np.flatnonzero(inserted >= now - self.ttl)[-self.max_entries:]
+            self._index[namespace] = (vectors[keep], [responses[i] for i in keep], inserted[keep])
+
+
+async def embed_text(text: str, model: str = EMBED_MODEL) -> Optional[np.ndarray]:
+    """
+    Embed text with a local Ollama embedding model.
+
+    Args:
+        text: Text to embed
+        model: Embedding model name
+
+    Returns:
+        L2-normalized embedding, or None if the embedding model is unavailable
+    """
+    try:
+        response = await get_async_client().post(
+            f"{OLLAMA_BASE_URL}/api/embed",
+            content=orjson.dumps({"model": model, "input": text}),
+            headers=JSON_HEADERS,
+            timeout=30
+        )
+        if response.status_code != 200:
+            return None
+
+        vector = np.asarray(orjson.loads(response.content)["embeddings"][0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    except Exception as e:
+        print(f"Embedding error: {e}")
+        return None
+
+
+_cache: Optional[SemanticCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> SemanticCache:
+    """Return the process-wide semantic cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache()
+    return _cache
+
+
+async def _stream_llm(
+    messages: List[Dict[str, str]],
+    model: str,
+    until_json: bool,
+    on_chunk: Optional[Callable[[str], None]]
+) -> str:
+    """
+    Stream a response, optionally stopping once a JSON object is complete.
+
+    Args:
+        messages: List of message dictionaries with 'role' and 'content' keys
+        model: Model name to use
+        until_json: Stop reading as soon as the first JSON object is balanced
+        on_chunk: Callback invoked with each content delta
+
+    Returns:
+        The streamed response text
+    """
+    scanner = JSONObjectScanner() if until_json else None
+    parts: List[str] = []
+
+    async with aclosing(achat_llm_stream(messages, model)) as stream:
+        async for chunk in stream:
+            parts.append(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+            if scanner is not None and scanner.feed(chunk) is not None:
+                # Closing the stream drops the connection, which stops generation
+                break
+
+    return "".join(parts)
+
+
+async def cached_chat_llm(
+    messages: List[Dict[str, str]],
+    model: str = DEFAULT_MODEL,
+    until_json: bool = False,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    semantic_text: Optional[str] = None
+) -> str:
+    """
+    Drop-in replacement for ``achat_llm`` that serves repeat prompts from cache.
+
+    Exact prompt matches are served from disk. When ``semantic_text`` is
+    given it is embedded and compared against earlier prompts for the same
+    system prompt. Callers pass only the prompt's variable fields (product
+    and personas): the surrounding template is constant, so embedding the
+    whole message would make different products look near-identical. On a
+    miss the response is streamed when ``until_json`` or ``on_chunk`` is
+    given.
+
+    Args:
+        messages: List of message dictionaries with 'role' and 'content' keys
+        model: Model name to use
+        until_json: Stop generation as soon as a complete JSON object arrives
+        on_chunk: Callback receiving the response progressively (a cached
+            response is delivered as a single chunk)
+        semantic_text: Text to embed for the similarity lookup; ``None``
+            restricts the cache to exact prompt matches
+
+    Returns:
+        Cached or freshly generated LLM response
+    """
+    stream = until_json or on_chunk is not None
+
+    if not LLM_CACHE_ENABLED:
+        if stream:
+            return await _stream_llm(messages, model, until_json, on_chunk)
+        return await achat_llm(messages, model)
+
+    system = "\n".join(m["content"] for m in messages if m["role"] == "system")
+    user = "\n".join(m["content"] for m in messages if m["role"] != "system")
+
+    cache = get_cache()
+    key = cache.make_key(system, user, model)
+    namespace = embedding = None
+
+    cached = cache.get(key)
+    if cached is None and semantic_text is not None:
+        namespace = cache.make_key(system, "", model)
+        embedding = await embed_text(semantic_text)
+        if embedding is not None:
+            cached = cache.lookup(namespace, embedding)
+
+    if cached is not None:
+        if on_chunk is not None:
+            on_chunk(cached)
+        return cached
+
+    if stream:
+        response = await _stream_llm(messages, model, until_json, on_chunk)
+    else:
+        response = await achat_llm(messages, model)
+    cache.put(key, response, namespace, embedding)
+
+    return response
+
+
+async def cached_persona_reactions(
+    personas: List[str],
+    product_description: str,
+    model: str = DEFAULT_MODEL
+) -> List[str]:
+    """
+    Generate persona reactions, reusing cached ones for unchanged personas.
+
+    Reactions are cached by exact (persona, product, model) only; similar
+    personas must still react independently. Only the misses are dispatched
+    to ``generate_persona_reactions_batch``.
+
+    Args:
+        personas: List of persona descriptions
+        product_description: Description of the product/brand
+        model: Model to use for generation
+
+    Returns:
+        Synthetic customer reactions, in the same order as ``personas``
+    """
+    if not LLM_CACHE_ENABLED:
+        return await generate_persona_reactions_batch(personas, product_description, model)
+
+    cache = get_cache()
+    keys = [
+        cache.make_key("persona-reaction", f"{persona}\0{product_description}", model)
+        for persona in personas
+    ]
+    reactions = [cache.get(key) for key in keys]
+
+    missing = [i for i, reaction in enumerate(reactions) if reaction is None]
+    if missing:
+        fresh = await generate_persona_reactions_batch(
+            [personas[i] for i in missing], product_description, model
+        )
+        for i, reaction in zip(missing, fresh):
+            reactions[i] = reaction
+            cache.put(keys[i], reaction)
+
+    return reactions
+
@@ -1,28 +1,119 @@
 """LangGraph multi-agent system for creative agency analysis."""
-from typing import List, Dict, Any, TypedDict
+from typing import List, Dict, Any, Optional, Tuple, TypedDict, Annotated, AsyncIterator
+from functools import partial
 from langgraph.graph import StateGraph, END
-import json
-from ollama_client import chat_llm
+from langgraph.types import Send, StreamWriter
+import orjson
+from agents.cache import cached_chat_llm
+from ollama_client import awarm_prompt, aclose_async_client, run_async
+from agents.json_stream import extract_first_json_object
 from agents.prompts import (
     SYSTEM_BRANDING_AGENT, SYSTEM_MARKETING_AGENT, SYSTEM_PRODUCT_AGENT,
-    SYSTEM_ONLINE_TRENDS_AGENT, SYSTEM_SUPERVISOR, SUPERVISOR_SYNTHESIS_PROMPT
+    SYSTEM_ANALYSIS_AGENT, SYSTEM_ONLINE_TRENDS_AGENT, SYSTEM_SUPERVISOR,
+    SUPERVISOR_SYNTHESIS_PROMPT, BRANDING_CONTEXT_TEMPLATE, MARKETING_CONTEXT_TEMPLATE,
+    PRODUCT_CONTEXT_TEMPLATE, ANALYSIS_CONTEXT_TEMPLATE, TRENDS_CONTEXT_TEMPLATE
 )
-from agents.tools import search_recent_trends
-import time
+from dotenv import load_dotenv
+import asyncio
+import operator
+import os
+
+# Load environment variables
+load_dotenv()
+
+# Answer branding, marketing and product in one LLM call instead of three
+COMBINED_ANALYSIS = os.getenv("COMBINED_ANALYSIS", "True").lower() == "true"
 
 class AgentState(TypedDict):
-    """State structure for the multi-agent system."""
+    """
+    State structure for the multi-agent system.
+    
+    Agent outputs are merged with ``operator.or_`` so updates from agents
+    running in the same parallel step combine instead of conflicting.
+    """
     personas: List[str]
     product_description: str
     persona_reactions: List[str]
-    branding_output: Dict[str, Any]
-    marketing_output: Dict[str, Any]
-    product_output: Dict[str, Any]
-    trends_output: Dict[str, Any]
+    persona_block: str
+    branding_output: Annotated[Dict[str, Any], operator.or_]
+    marketing_output: Annotated[Dict[str, Any], operator.or_]
+    product_output: Annotated[Dict[str, Any], operator.or_]
+    trends_output: Annotated[Dict[str, Any], operator.or_]
     final_report: str
 
 
-def branding_agent(state: AgentState) -> Dict[str, Any]:
+def _bullet_list(items: List[str]) -> str:
+    """
+    Format items as a markdown bullet list.
+    
+    Args:
+        items: Lines to format
+        
+    Returns:
+        Newline-separated "- item" lines, or an empty string
+    """
+    return "- " + "\n- ".join(items) if items else ""
+
+
+def _semantic_text(state: AgentState) -> str:
+    """
+    Return the variable part of an agent prompt for the semantic cache.
+    
+    Args:
+        state: Current agent state
+        
+    Returns:
+        Product description and persona reactions, without the prompt template
+    """
+    return f"{state['product_description']}\n{state['persona_block']}"
+
+
+def _safe_parse(
+    response: str,
+    *,
+    keys: Tuple[str, ...],
+    placeholders: Tuple[str, ...] = (),
+    limit: Optional[int] = None,
+    skip_json_lines: bool = False
+) -> Dict[str, Any]:
+    """
+    Parse an agent response as JSON, falling back to line-based extraction.
+    
+    Args:
+        response: Raw LLM response
+        keys: Output keys; with several keys the fallback lines are split
+            between them, earlier keys getting the smaller share (with two
+            keys: first ``n // 2`` lines, then the rest)
+        placeholders: Per-key placeholder used when the response has no lines
+        limit: Maximum number of fallback lines per key
+        skip_json_lines: Drop fallback lines starting with ``{`` (stray JSON)
+        
+    Returns:
+        Parsed JSON object or the structured fallback
+    """
+    parsed = extract_first_json_object(response)
+    if parsed is not None:
+        return parsed
+    
+    # Single pass over the text: strip and drop blanks (and stray JSON fragments)
+    lines = [
+        line for line in (raw.strip() for raw in response.split('\n'))
+        if line and not (skip_json_lines and line.startswith('{'))
+    ]
+    
+    if not lines:
+        if placeholders:
+            return {key: [placeholder] for key, placeholder in zip(keys, placeholders)}
+        return {key: [] for key in keys}
+    
+    bounds = [i * len(lines) // len(keys) for i in range(len(keys))] + [len(lines)]
+    return {
+        key: lines[bounds[i]:bounds[i + 1]][:limit]
+        for i, key in enumerate(keys)
+    }
+
+
+async def branding_agent(state: AgentState) -> Dict[str, Any]:
     """
     Branding agent that evaluates brand positioning and aesthetics.
     
@@ -33,35 +124,22 @@ def branding_agent(state: AgentState) -> Dict[str, Any]:
         Updated state with branding analysis
     """
     try:
-        time.sleep(2)
+        await asyncio.sleep(2)
         # Prepare context for branding analysis
-        context = f"""
-Product/Brand: {state['product_description']}
-
-Persona Reactions:
-{chr(10).join([f"- {reaction}" for reaction in state['persona_reactions']])}
-
-As a senior brand strategist from McKinsey & Company with an MBA from Harvard Business School, analyze the brand positioning, visual identity, and tone-of-voice alignment with these personas. Provide strategic insights that would be expected from a top-tier consulting firm.
-        """.strip()
+        context = BRANDING_CONTEXT_TEMPLATE.substitute(
+            product_description=state['product_description'],
+            persona_reactions=state['persona_block']
+        )
         
         messages = [
             {"role": "system", "content": SYSTEM_BRANDING_AGENT},
             {"role": "user", "content": context}
         ]
         
-        response = chat_llm(messages)
+        response = await cached_chat_llm(messages, until_json=True, semantic_text=_semantic_text(state))
         
         # Try to parse JSON response, fallback to structured format
-        try:
-            branding_output = json.loads(response)
-        except json.JSONDecodeError:
-            # Fallback: extract advice from text
-            branding_output = {
-                "branding_advice": [
-                    line.strip() for line in response.split('\n') 
-                    if line.strip() and not line.strip().startswith('{')
-                ][:5]
-            }
+        branding_output = _safe_parse(response, keys=("branding_advice",), limit=5, skip_json_lines=True)
         
         return {"branding_output": branding_output}
         
@@ -74,7 +152,7 @@ As a senior brand strategist from McKinsey & Company with an MBA from Harvard Bu
         }
 
 
-def marketing_agent(state: AgentState) -> Dict[str, Any]:
+async def marketing_agent(state: AgentState) -> Dict[str, Any]:
     """
     Marketing agent that proposes GTM strategy and pricing.
     
@@ -85,32 +163,24 @@ def marketing_agent(state: AgentState) -> Dict[str, Any]:
         Updated state with marketing analysis
     """
     try:
-        time.sleep(2)
-        context = f"""
-Product/Brand: {state['product_description']}
-
-Persona Reactions:
-{chr(10).join([f"- {reaction}" for reaction in state['persona_reactions']])}
-
-As a senior marketing strategist from Google with an MBA from Wharton School of Business, analyze the go-to-market strategy, distribution channels, and pricing model. Provide strategic insights that would be expected from a top-tier tech company's marketing team.
-        """.strip()
+        await asyncio.sleep(2)
+        context = MARKETING_CONTEXT_TEMPLATE.substitute(
+            product_description=state['product_description'],
+            persona_reactions=state['persona_block']
+        )
         
         messages = [
             {"role": "system", "content": SYSTEM_MARKETING_AGENT},
             {"role": "user", "content": context}
         ]
         
-        response = chat_llm(messages)
+        response = await cached_chat_llm(messages, until_json=True, semantic_text=_semantic_text(state))
         
-        try:
-            marketing_output = json.loads(response)
-        except json.JSONDecodeError:
-            # Fallback structure
-            lines = [line.strip() for line in response.split('\n') if line.strip()]
-            marketing_output = {
-                "marketing_plan": lines[:len(lines)//2] if lines else ["No marketing plan generated"],
-                "pricing_tips": lines[len(lines)//2:] if lines else ["No pricing tips generated"]
-            }
+        marketing_output = _safe_parse(
+            response,
+            keys=("marketing_plan", "pricing_tips"),
+            placeholders=("No marketing plan generated", "No pricing tips generated")
+        )
         
         return {"marketing_output": marketing_output}
         
@@ -124,7 +194,7 @@ As a senior marketing strategist from Google with an MBA from Wharton School of
         }
 
 
-def product_agent(state: AgentState) -> Dict[str, Any]:
+async def product_agent(state: AgentState) -> Dict[str, Any]:
     """
     Product agent that analyzes feature gaps and opportunities.
     
@@ -135,31 +205,24 @@ def product_agent(state: AgentState) -> Dict[str, Any]:
         Updated state with product analysis
     """
     try:
-        time.sleep(2)
-        context = f"""
-Product/Brand: {state['product_description']}
-
-Persona Reactions:
-{chr(10).join([f"- {reaction}" for reaction in state['persona_reactions']])}
-
-As a senior product manager from Apple with an MBA from Stanford Graduate School of Business, analyze feature alignment with persona needs and identify gaps and quick wins. Provide strategic insights that would be expected from a top-tier tech company's product team.
-        """.strip()
+        await asyncio.sleep(2)
+        context = PRODUCT_CONTEXT_TEMPLATE.substitute(
+            product_description=state['product_description'],
+            persona_reactions=state['persona_block']
+        )
         
         messages = [
             {"role": "system", "content": SYSTEM_PRODUCT_AGENT},
             {"role": "user", "content": context}
         ]
         
-        response = chat_llm(messages)
+        response = await cached_chat_llm(messages, until_json=True, semantic_text=_semantic_text(state))
         
-        try:
-            product_output = json.loads(response)
-        except json.JSONDecodeError:
-            lines = [line.strip() for line in response.split('\n') if line.strip()]
-            product_output = {
-                "feature_gaps": lines[:len(lines)//2] if lines else ["No feature gaps identified"],
-                "quick_wins": lines[len(lines)//2:] if lines else ["No quick wins identified"]
-            }
+        product_output = _safe_parse(
+            response,
+            keys=("feature_gaps", "quick_wins"),
+            placeholders=("No feature gaps identified", "No quick wins identified")
+        )
         
         return {"product_output": product_output}
         
@@ -173,7 +236,67 @@ As a senior product manager from Apple with an MBA from Stanford Graduate School
         }
 
 
-def trends_agent(state: AgentState) -> Dict[str, Any]:
+async def analysis_agent(state: AgentState) -> Dict[str, Any]:
+    """
+    Combined branding, marketing and product agent.
+    
+    The three specialists share the same context, so a single call with a
+    combined system prompt saves two prefills of the persona block.
+    
+    Args:
+        state: Current agent state
+        
+    Returns:
+        Updated state with branding, marketing and product analyses
+    """
+    fallback = {
+        "branding": {"branding_advice": ["No branding advice generated"]},
+        "marketing": {
+            "marketing_plan": ["No marketing plan generated"],
+            "pricing_tips": ["No pricing tips generated"]
+        },
+        "product": {
+            "feature_gaps": ["No feature gaps identified"],
+            "quick_wins": ["No quick wins identified"]
+        }
+    }
+    
+    try:
+        await asyncio.sleep(2)
+        context = ANALYSIS_CONTEXT_TEMPLATE.substitute(
+            product_description=state['product_description'],
+            persona_reactions=state['persona_block']
+        )
+        
+        messages = [
+            {"role": "system", "content": SYSTEM_ANALYSIS_AGENT},
+            {"role": "user", "content": context}
+        ]
+        
+        response = await cached_chat_llm(messages, until_json=True, semantic_text=_semantic_text(state))
+        
+        sections = extract_first_json_object(response) or {}
+        outputs = {
+            key: sections[key] if isinstance(sections.get(key), dict) else fallback[key]
+            for key in fallback
+        }
+        
+        return {
+            "branding_output": outputs["branding"],
+            "marketing_output": outputs["marketing"],
+            "product_output": outputs["product"]
+        }
+        
+    except Exception as e:
+        print(f"Analysis agent error: {e}")
+        return {
+            "branding_output": {"branding_advice": ["Error in branding analysis", str(e)]},
+            "marketing_output": {"marketing_plan": ["Error in marketing analysis"], "pricing_tips": [str(e)]},
+            "product_output": {"feature_gaps": ["Error in product analysis"], "quick_wins": [str(e)]}
+        }
+
+
+async def trends_agent(state: AgentState) -> Dict[str, Any]:
     """
     Online trends agent that fetches live market signals.
     
@@ -184,33 +307,33 @@ def trends_agent(state: AgentState) -> Dict[str, Any]:
         Updated state with trends analysis
     """
     try:
-        time.sleep(2)
+        await asyncio.sleep(2)
+        # Deferred so the web search and keyword stacks only load when trends actually run
+        from agents.keywords import top_keywords
+        from agents.tools import asearch_recent_trends
+        
         # Extract keywords from product description for trend search
-        product_keywords = state['product_description'][:100]  # First 100 chars
+        product_keywords = top_keywords(state['product_description'])
         
         # Search for recent trends
-        trend_results = search_recent_trends(product_keywords, days_back=90)
+        trend_results = await asearch_recent_trends(product_keywords, days_back=90)
         
         # Use LLM to analyze trends in context
-        context = f"""
-Product/Brand: {state['product_description']}
-
-Recent Trends Found:
-{chr(10).join([f"- {trend}" for trend in trend_results])}
-
-Analyze how these trends relate to the product and personas.
-        """.strip()
+        context = TRENDS_CONTEXT_TEMPLATE.substitute(
+            product_description=state['product_description'],
+            trends=_bullet_list(trend_results)
+        )
         
         messages = [
             {"role": "system", "content": SYSTEM_ONLINE_TRENDS_AGENT},
             {"role": "user", "content": context}
         ]
         
-        response = chat_llm(messages)
+        # Live trends change between runs, so only reuse exact prompt matches
+        response = await cached_chat_llm(messages, until_json=True)
         
-        try:
-            trends_output = json.loads(response)
-        except json.JSONDecodeError:
+        trends_output = extract_first_json_object(response)
+        if trends_output is None:
             trends_output = {
                 "trends": trend_results if trend_results else ["No recent trends found"]
             }
@@ -226,25 +349,26 @@ Analyze how these trends relate to the product and personas.
         }
 
 
-def supervisor_agent(state: AgentState) -> Dict[str, Any]:
+async def supervisor_agent(state: AgentState, writer: StreamWriter = None) -> Dict[str, Any]:
     """
     Supervisor agent that synthesizes all analyses into final report.
     
     Args:
         state: Current agent state with all agent outputs
+        writer: LangGraph stream writer used to emit the report as it is generated
         
     Returns:
         Updated state with final report
     """
     try:
-        time.sleep(2)
+        await asyncio.sleep(2)
         # Format all outputs for synthesis
         synthesis_prompt = SUPERVISOR_SYNTHESIS_PROMPT.format(
-            branding_output=json.dumps(state['branding_output'], indent=2),
-            marketing_output=json.dumps(state['marketing_output'], indent=2),
-            product_output=json.dumps(state['product_output'], indent=2),
-            trends_output=json.dumps(state['trends_output'], indent=2),
-            persona_reactions='\n'.join([f"- {reaction}" for reaction in state['persona_reactions']]),
+            branding_output=orjson.dumps(state['branding_output']).decode(),
+            marketing_output=orjson.dumps(state['marketing_output']).decode(),
+            product_output=orjson.dumps(state['product_output']).decode(),
+            trends_output=orjson.dumps(state['trends_output']).decode(),
+            persona_reactions=state['persona_block'],
             product_description=state['product_description']
         )
         
@@ -253,14 +377,14 @@ def supervisor_agent(state: AgentState) -> Dict[str, Any]:
             {"role": "user", "content": synthesis_prompt}
         ]
         
-        final_report = chat_llm(messages)
+        # The report depends on every agent output, so only reuse exact prompt matches
+        final_report = await cached_chat_llm(messages, on_chunk=writer)
         
         return {"final_report": final_report}
         
     except Exception as e:
         print(f"Supervisor agent error: {e}")
-        return {
-            "final_report": f"""
+        error_report = f"""
 # Creative Agency Analysis Report
 
 ## Executive Summary
@@ -274,46 +398,109 @@ An error occurred during analysis synthesis: {str(e)}
 
 Please check the system logs and try again.
             """.strip()
-        }
+        
+        if writer is not None:
+            writer(error_report)
+        
+        return {"final_report": error_report}
+
 
+# Independent agents that run in parallel before the supervisor
+SPECIALIST_AGENTS = ("branding", "marketing", "product", "trends")
+COMBINED_AGENTS = ("analysis", "trends")
 
-def create_agent_graph() -> StateGraph:
+# System prompt each agent node sends, for KV-cache warm-up
+AGENT_SYSTEM_PROMPTS = {
+    "branding": SYSTEM_BRANDING_AGENT,
+    "marketing": SYSTEM_MARKETING_AGENT,
+    "product": SYSTEM_PRODUCT_AGENT,
+    "analysis": SYSTEM_ANALYSIS_AGENT,
+    "trends": SYSTEM_ONLINE_TRENDS_AGENT,
+}
+
+
+def dispatch_agents(state: AgentState) -> Dict[str, Any]:
+    """
+    Entry node that prepares shared context before fanning out to the agents.
+    
+    Builds the bulleted persona reaction block once so the specialist agents
+    and the supervisor don't each rebuild it.
+    
+    Args:
+        state: Current agent state
+        
+    Returns:
+        Updated state with the persona reaction block
+    """
+    return {"persona_block": _bullet_list(state['persona_reactions'])}
+
+
+def fan_out_agents(state: AgentState, agents: Tuple[str, ...] = SPECIALIST_AGENTS) -> List[Send]:
+    """
+    Fan the state out to the independent analysis agents.
+    
+    Each agent only reads ``product_description`` and ``persona_reactions`` and
+    writes its own output keys, so they can run in the same superstep.
+    
+    Args:
+        state: Current agent state
+        agents: Names of the agent nodes to send the state to
+        
+    Returns:
+        One ``Send`` per agent
+    """
+    return [Send(node, state) for node in agents]
+
+
+def create_agent_graph(combined: bool = COMBINED_ANALYSIS) -> StateGraph:
     """
     Create the LangGraph multi-agent workflow.
     
+    Args:
+        combined: Run branding, marketing and product as one ``analysis`` node
+        
     Returns:
         Compiled StateGraph ready for execution
     """
+    agents = COMBINED_AGENTS if combined else SPECIALIST_AGENTS
+    
     # Create the graph
     workflow = StateGraph(AgentState)
     
     # Add nodes
-    workflow.add_node("branding", branding_agent)
-    workflow.add_node("marketing", marketing_agent)
-    workflow.add_node("product", product_agent)
+    workflow.add_node("dispatch", dispatch_agents)
+    if combined:
+        workflow.add_node("analysis", analysis_agent)
+    else:
+        workflow.add_node("branding", branding_agent)
+        workflow.add_node("marketing", marketing_agent)
+        workflow.add_node("product", product_agent)
     workflow.add_node("trends", trends_agent)
     workflow.add_node("supervisor", supervisor_agent)
     
     # Set entry point
-    workflow.set_entry_point("branding")
+    workflow.set_entry_point("dispatch")
     
-    # Add edges (parallel execution of first 4 agents, then supervisor)
-    workflow.add_edge("branding", "marketing")
-    workflow.add_edge("marketing", "product")
-    workflow.add_edge("product", "trends")
-    workflow.add_edge("trends", "supervisor")
+    # Add edges (parallel execution of the analysis agents, then supervisor)
+    workflow.add_conditional_edges("dispatch", partial(fan_out_agents, agents=agents), list(agents))
+    for node in agents:
+        workflow.add_edge(node, "supervisor")
     workflow.add_edge("supervisor", END)
     
     return workflow
 
 
-def run_agent_analysis(
+# The workflow is static, so compile it once and reuse it for every analysis
+_COMPILED_GRAPH = create_agent_graph().compile()
+
+
+def _initial_state(
     personas: List[str], 
     product_description: str, 
     persona_reactions: List[str]
-) -> str:
+) -> AgentState:
     """
-    Run the complete agent analysis workflow.
+    Build the initial workflow state.
     
     Args:
         personas: List of persona descriptions
@@ -321,25 +508,121 @@ def run_agent_analysis(
         persona_reactions: List of persona reactions from Ollama
         
     Returns:
-        Final markdown report from supervisor
+        Initial AgentState with empty agent outputs
     """
-    # Create initial state
-    initial_state = AgentState(
+    return AgentState(
         personas=personas,
         product_description=product_description,
         persona_reactions=persona_reactions,
+        persona_block="",
         branding_output={},
         marketing_output={},
         product_output={},
         trends_output={},
         final_report=""
     )
+
+
+async def arun_agent_analysis(
+    personas: List[str], 
+    product_description: str, 
+    persona_reactions: List[str]
+) -> str:
+    """
+    Run the complete agent analysis workflow on the current event loop.
+    
+    Args:
+        personas: List of persona descriptions
+        product_description: Product/brand description
+        persona_reactions: List of persona reactions from Ollama
+        
+    Returns:
+        Final markdown report from supervisor
+    """
+    initial_state = _initial_state(personas, product_description, persona_reactions)
+    
+    # Run the precompiled workflow
+    result = await _COMPILED_GRAPH.ainvoke(initial_state)
+    
+    return result.get("final_report", "No report generated")
+
+
+async def astream_agent_analysis(
+    personas: List[str], 
+    product_description: str, 
+    persona_reactions: List[str],
+    result: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[str]:
+    """
+    Run the workflow and stream the supervisor's report as it is generated.
+    
+    Meant to be driven to completion on its own event loop (as
+    ``st.write_stream`` does); the loop's shared HTTP client is closed when
+    the stream ends. The streamed chunks are for live display only: if the
+    report fails midway, the supervisor's error report is streamed after the
+    partial text, so callers should keep the report from ``result``.
+    
+    Args:
+        personas: List of persona descriptions
+        product_description: Product/brand description
+        persona_reactions: List of persona reactions from Ollama
+        result: Filled with the final graph state's ``final_report``
+        
+    Yields:
+        Chunks of the final markdown report
+    """
+    initial_state = _initial_state(personas, product_description, persona_reactions)
     
-    # Create and compile graph
-    graph = create_agent_graph()
-    compiled_graph = graph.compile()
+    try:
+        async for mode, chunk in _COMPILED_GRAPH.astream(initial_state, stream_mode=["custom", "values"]):
+            if mode == "custom":
+                yield chunk
+            elif result is not None:
+                result["final_report"] = chunk.get("final_report", "")
+    finally:
+        await aclose_async_client()
+
+
+async def awarm_agent_prompts(combined: bool = COMBINED_ANALYSIS) -> List[bool]:
+    """
+    Prefill the system prompts of the active agent layout in Ollama's KV cache.
+    
+    Args:
+        combined: Warm the combined ``analysis`` prompt instead of the
+            branding, marketing and product prompts
+        
+    Returns:
+        Per-prompt flags indicating whether the warm-up succeeded
+    """
+    agents = COMBINED_AGENTS if combined else SPECIALIST_AGENTS
+    system_prompts = [AGENT_SYSTEM_PROMPTS[agent] for agent in agents] + [SYSTEM_SUPERVISOR]
+    return await asyncio.gather(*(awarm_prompt(prompt) for prompt in system_prompts))
+
+
+def warm_agent_prompts() -> List[bool]:
+    """
+    Synchronous wrapper around ``awarm_agent_prompts`` for app startup.
     
-    # Run the workflow
-    result = compiled_graph.invoke(initial_state)
+    Returns:
+        Per-prompt flags indicating whether the warm-up succeeded
+    """
+    return run_async(awarm_agent_prompts())
+
+
+def run_agent_analysis(
+    personas: List[str], 
+    product_description: str, 
+    persona_reactions: List[str]
+) -> str:
+    """
+    Run the complete agent analysis workflow.
     
-    return result.get("final_report", "No report generated") 
\ No newline at end of file
+    Args:
+        personas: List of persona descriptions
+        product_description: Product/brand description
+        persona_reactions: List of persona reactions from Ollama
+        
+    Returns:
+        Final markdown report from supervisor
+    """
+    return run_async(arun_agent_analysis(personas, product_description, persona_reactions))
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""Incremental extraction of JSON objects from chatty LLM output."""
+from typing import Any, Dict, List, Optional
+import orjson
+
+
+class JSONObjectScanner:
+    """
+    Stateful bracket-depth scanner that finds the first balanced JSON object.
+
+    Text can be fed in arbitrary chunks (e.g. as tokens stream in); the scanner
+    tracks brace depth, string literals and escapes across chunk boundaries and
+    only buffers text belonging to the current candidate object.
+    """
+
+    def __init__(self):
+        """Initialize an empty scanner."""
+        self.result: Optional[Dict[str, Any]] = None
+        self._parts: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def done(self) -> bool:
+        """Whether a complete JSON object has been found."""
+        return self.result is not None
+
+    def feed(self, chunk: str) -> Optional[Dict[str, Any]]:
+        """
+        Feed the next chunk of text into the scanner.
+
+        Args:
+            chunk: Next piece of model output
+
+        Returns:
+            The first valid JSON object once it is balanced, otherwise None
+        """
+        if self.result is not None:
+            return self.result
+
+        i = 0
+        while i < len(chunk):
+            if self._depth == 0:
+                # Skip prose between objects without a per-character loop
+                i = chunk.find("{", i)
+                if i == -1:
+                    return None
+
+            end = self._scan(chunk, i)
+            if end is None:
+                # Object continues in the next chunk
+                self._parts.append(chunk[i:])
+                return None
+
+            self._parts.append(chunk[i:end])
+            candidate = "".join(self._parts)
+            self._parts = []
+
+            try:
+                parsed = orjson.loads(candidate)
+            except orjson.JSONDecodeError:
+                # Balanced braces but not JSON (e.g. "{key:list}" in prose);
+                # rescan from just after the opening brace
+                chunk = candidate[1:] + chunk[end:]
+                i = 0
+                continue
+
+            if isinstance(parsed, dict):
+                self.result = parsed
+                return parsed
+
+            i = end
+
+        return None
+
+    def _scan(self, chunk: str, start: int) -> Optional[int]:
+        """
+        Advance the scanner state over ``chunk`` from ``start``.
+
+        Args:
+            chunk: Text to scan
+            start: Index to start scanning from
+
+        Returns:
+            Index just past the closing brace of the current object, or None
+            if the object is still open at the end of the chunk
+        """
+        for index in range(start, len(chunk)):
+            char = chunk[index]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    return index + 1
+
+        return None
+
+
+def extract_first_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Extract the first valid JSON object from model output.
+
+    Args:
+        text: Raw model output, possibly wrapping JSON in prose or code fences
+
+    Returns:
+        Parsed JSON object, or None if the text contains no valid object
+    """
+    stripped = text.strip()
+
+    # Fast path: the model returned bare JSON
+    if stripped.startswith("{"):
+        try:
+            parsed = orjson.loads(stripped)
+            if isinstance(parsed, dict):
+                return parsed
+        except orjson.JSONDecodeError:
+            pass
+
+    return JSONObjectScanner().feed(text)
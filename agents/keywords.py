@@ -0,0 +1,27 @@
+"""Keyword extraction for building web search queries."""
+from functools import lru_cache
+import yake
+
+
+@lru_cache(maxsize=256)
+def top_keywords(description: str, k: int = 6) -> str:
+    """
+    Extract the top keyphrases from a product description for search queries.
+    
+    Args:
+        description: Product/brand description
+        k: Number of keyphrases to extract
+        
+    Returns:
+        Space-separated keywords (duplicate words removed, best first)
+    """
+    extractor = yake.KeywordExtractor(n=2, top=k)
+    keyphrases = [keyphrase for keyphrase, _ in extractor.extract_keywords(description)]
+    
+    if not keyphrases:
+        # Too little text to rank; fall back to the leading words
+        return " ".join(description.split()[:10])
+    
+    # Overlapping keyphrases ("Ice Cream", "Cream") repeat words in the query
+    words = dict.fromkeys(word for keyphrase in keyphrases for word in keyphrase.split())
+    return " ".join(words)
@@ -1,10 +1,42 @@
 """Web search tool for fetching live trends and social signals."""
-from typing import List, Dict, Any
-from duckduckgo_search import DDGS
+from typing import List, Dict, Any, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from dotenv import load_dotenv
+import asyncio
+import itertools
 import json
+import logging
+import os
+import re
+import threading
 import time
 from datetime import datetime, timedelta
 
+if TYPE_CHECKING:
+    from duckduckgo_search import DDGS
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Bounded pool for the blocking DDGS calls, shared by all concurrent searches
+_SEARCH_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SEARCH_PARALLEL", "4")),
+    thread_name_prefix="ddgs"
+)
+# Attempts per DDGS lookup on rate-limit/timeout errors
+SEARCH_RETRIES = 3
+
+# Process-wide cache of search results; queries within the same week share an entry
+_SEARCH_CACHE: TTLCache = TTLCache(maxsize=512, ttl=900)
+# TTLCache isn't thread-safe and every Streamlit session thread runs its own loop
+_SEARCH_CACHE_LOCK = threading.Lock()
+
+# Signals that a search result describes a trend
+_TREND_RE = re.compile(r"\b(?:trending|viral|popular|growing|rising)\b", re.IGNORECASE)
+
 
 class WebSearchTool:
     """Tool for searching recent trends and news using DuckDuckGo."""
@@ -17,12 +49,29 @@ class WebSearchTool:
             max_results: Maximum number of search results to return
         """
         self.max_results = max_results
-        self.ddgs = DDGS()
     
-    def search_trends(self, query: str, days_back: int = 90) -> List[Dict[str, Any]]:
+    def session(self) -> "DDGS":
+        """
+        Create a fresh DuckDuckGo session.
+        
+        DDGS holds an HTTP session that isn't documented as thread-safe, so
+        every lookup opens its own instead of sharing one across threads.
+        The library is imported lazily so importing this module stays cheap.
+        
+        Returns:
+            New DDGS instance, usable as a context manager
+        """
+        from duckduckgo_search import DDGS
+        
+        return DDGS()
+    
+    async def asearch_trends(self, query: str, days_back: int = 90) -> List[Dict[str, Any]]:
         """
         Search for recent trends and news related to the query.
         
+        News and web lookups are issued concurrently; DDGS is blocking, so each
+        lookup runs on the bounded search thread pool.
+        
         Args:
             query: Search query string
             days_back: How many days back to search (default: 90)
@@ -30,6 +79,12 @@ class WebSearchTool:
         Returns:
             List of search results with title, snippet, and URL
         """
+        cache_key = (query, days_back // 7, self.max_results)
+        with _SEARCH_CACHE_LOCK:
+            cached = _SEARCH_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             # Calculate date range for recent results
             end_date = datetime.now()
@@ -38,51 +93,111 @@ class WebSearchTool:
             # Enhance query with trend-related keywords
             enhanced_query = f"{query} trends social media viral hashtag 2025"
             
-            results = []
+            loop = asyncio.get_running_loop()
+            news_results, web_results = await asyncio.gather(
+                loop.run_in_executor(_SEARCH_POOL, self._search_news, enhanced_query),
+                loop.run_in_executor(_SEARCH_POOL, self._search_web, enhanced_query)
+            )
             
-            # Search news
-            try:
-                news_results = list(self.ddgs.news(
-                    keywords=enhanced_query,
-                    max_results=self.max_results // 2
-                ))
-                
-                for result in news_results:
-                    results.append({
-                        "title": result.get("title", ""),
-                        "snippet": result.get("body", ""),
-                        "url": result.get("url", ""),
-                        "date": result.get("date", ""),
-                        "source": "news"
-                    })
-            except Exception as e:
-                print(f"News search failed: {e}")
+            results = (news_results + web_results)[:self.max_results]
+            if results:
+                with _SEARCH_CACHE_LOCK:
+                    _SEARCH_CACHE[cache_key] = results
+            
+            return results
+            
+        except Exception as e:
+            logger.warning("Search error: %s", e)
+            return []
+    
+    def _lookup(self, method: str, query: str) -> List[Dict[str, Any]]:
+        """
+        Run a blocking DDGS lookup, retrying transient failures with backoff.
+        
+        Args:
+            method: DDGS method name ("news" or "text")
+            query: Enhanced search query
             
-            # Search general web
+        Returns:
+            Raw DDGS results, capped at half of ``max_results``
+            
+        Raises:
+            DuckDuckGoSearchException: If the lookup still fails after retries
+        """
+        from duckduckgo_search.exceptions import RatelimitException, TimeoutException
+        
+        limit = self.max_results // 2
+        
+        for attempt in range(SEARCH_RETRIES):
             try:
-                web_results = list(self.ddgs.text(
-                    keywords=enhanced_query,
-                    max_results=self.max_results // 2
-                ))
+                with self.session() as ddgs:
+                    # Bound the work explicitly in case the library over-fetches
+                    return list(itertools.islice(
+                        getattr(ddgs, method)(keywords=query, max_results=limit),
+                        limit
+                    ))
+            except (RatelimitException, TimeoutException) as e:
+                if attempt == SEARCH_RETRIES - 1:
+                    raise
                 
-                for result in web_results:
-                    results.append({
-                        "title": result.get("title", ""),
-                        "snippet": result.get("body", ""),
-                        "url": result.get("href", ""),
-                        "date": "",
-                        "source": "web"
-                    })
-            except Exception as e:
-                print(f"Web search failed: {e}")
+                delay = min(0.5 * (2 ** attempt), 4)
+                logger.warning(
+                    "%s search attempt %d/%d failed (%s), retrying in %.1f seconds...",
+                    method, attempt + 1, SEARCH_RETRIES, e, delay
+                )
+                time.sleep(delay)
+    
+    def _search_news(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Run a blocking DuckDuckGo news search.
+        
+        Args:
+            query: Enhanced search query
             
-            return results[:self.max_results]
+        Returns:
+            List of news results
+        """
+        results = []
+        try:
+            for result in self._lookup("news", query):
+                results.append({
+                    "title": result.get("title", ""),
+                    "snippet": result.get("body", ""),
+                    "url": result.get("url", ""),
+                    "date": result.get("date", ""),
+                    "source": "news"
+                })
+        except Exception as e:
+            logger.warning("News search failed: %s", e)
+        
+        return results
+    
+    def _search_web(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Run a blocking DuckDuckGo web search.
+        
+        Args:
+            query: Enhanced search query
             
+        Returns:
+            List of web results
+        """
+        results = []
+        try:
+            for result in self._lookup("text", query):
+                results.append({
+                    "title": result.get("title", ""),
+                    "snippet": result.get("body", ""),
+                    "url": result.get("href", ""),
+                    "date": "",
+                    "source": "web"
+                })
         except Exception as e:
-            print(f"Search error: {e}")
-            return []
+            logger.warning("Web search failed: %s", e)
+        
+        return results
     
-    def search_competitor_moves(self, brand_name: str, industry: str) -> List[Dict[str, Any]]:
+    async def asearch_competitor_moves(self, brand_name: str, industry: str) -> List[Dict[str, Any]]:
         """
         Search for recent competitor activities and moves.
         
@@ -99,23 +214,17 @@ class WebSearchTool:
             f"{industry} market trends new products"
         ]
         
-        all_results = []
-        for query in competitor_queries:
-            results = self.search_trends(query, days_back=60)
-            all_results.extend(results)
+        query_results = await asyncio.gather(
+            *(self.asearch_trends(query, days_back=60) for query in competitor_queries)
+        )
+        all_results = [result for results in query_results for result in results]
         
         # Remove duplicates based on URL
-        seen_urls = set()
-        unique_results = []
-        for result in all_results:
-            url = result.get("url", "")
-            if url and url not in seen_urls:
-                seen_urls.add(url)
-                unique_results.append(result)
-        
-        return unique_results[:self.max_results]
+        unique_results = {result["url"]: result for result in all_results if result.get("url")}
+        
+        return list(unique_results.values())[:self.max_results]
     
-    def search_viral_content(self, topic: str) -> List[Dict[str, Any]]:
+    async def asearch_viral_content(self, topic: str) -> List[Dict[str, Any]]:
         """
         Search for viral content formats and hashtags related to topic.
         
@@ -131,10 +240,11 @@ class WebSearchTool:
             f"{topic} viral marketing campaign recent"
         ]
         
-        all_results = []
-        for query in viral_queries:
-            results = self.search_trends(query, days_back=30)  # More recent for viral content
-            all_results.extend(results)
+        # More recent window for viral content
+        query_results = await asyncio.gather(
+            *(self.asearch_trends(query, days_back=30) for query in viral_queries)
+        )
+        all_results = [result for results in query_results for result in results]
         
         return all_results[:self.max_results]
     
@@ -155,8 +265,7 @@ class WebSearchTool:
             snippet = result.get("snippet", "")
             
             # Extract key trend indicators
-            if any(keyword in title.lower() or keyword in snippet.lower() 
-                   for keyword in ["trending", "viral", "popular", "growing", "rising"]):
+            if _TREND_RE.search(title) or _TREND_RE.search(snippet):
                 
                 # Create a concise trend summary
                 trend_text = f"{title[:100]}..." if len(title) > 100 else title
@@ -169,13 +278,25 @@ class WebSearchTool:
         return trends[:5]  # Return top 5 trends
 
 
-# Global instance for easy import
-web_search_tool = WebSearchTool()
+async def asearch_recent_trends(query: str, days_back: int = 90) -> List[str]:
+    """
+    Search for recent trends without blocking the event loop.
+    
+    Args:
+        query: Search query
+        days_back: Days to look back
+        
+    Returns:
+        List of trend summaries
+    """
+    web_search_tool = WebSearchTool()
+    results = await web_search_tool.asearch_trends(query, days_back)
+    return web_search_tool.extract_trends_summary(results)
 
 
 def search_recent_trends(query: str, days_back: int = 90) -> List[str]:
     """
-    Convenience function to search for recent trends.
+    Convenience function to search for recent trends from sync code.
     
     Args:
         query: Search query
@@ -184,5 +305,4 @@ def search_recent_trends(query: str, days_back: int = 90) -> List[str]:
     Returns:
         List of trend summaries
     """
-    results = web_search_tool.search_trends(query, days_back)
-    return web_search_tool.extract_trends_summary(results) 
\ No newline at end of file
+    return asyncio.run(asearch_recent_trends(query, days_back))
\ No newline at end of file
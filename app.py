@@ -3,14 +3,20 @@ Creative Agency Multi-Agent Analysis Tool
 Streamlit application for persona-based product analysis using LangGraph agents.
 """
 import streamlit as st
+import csv
+import io
+import json
+import logging
+import threading
 import time
-from typing import List, Tuple
+from typing import List, Sequence, Tuple
 from dotenv import load_dotenv
 import os
 
 # Import our modules
-from ollama_client import generate_persona_reaction, test_ollama_connection
-from agents.graph import run_agent_analysis
+from ollama_client import test_ollama_connection, run_async, logger as ollama_logger
+from agents.cache import cached_persona_reactions
+from agents.graph import astream_agent_analysis, warm_agent_prompts
 
 # Load environment variables
 load_dotenv()
@@ -24,6 +30,44 @@ st.set_page_config(
 )
 
 
+@st.cache_resource(show_spinner=False)
+def start_prompt_warmup() -> threading.Thread:
+    """
+    Warm Ollama's prompt cache with the agent system prompts once per server.
+    
+    Runs in a background thread so the first page render isn't blocked.
+    
+    Returns:
+        The warm-up thread
+    """
+    thread = threading.Thread(target=warm_agent_prompts, daemon=True)
+    thread.start()
+    return thread
+
+
+class StatusLogHandler(logging.Handler):
+    """Mirror Ollama retry warnings into a Streamlit status placeholder."""
+    
+    def __init__(self, placeholder):
+        """
+        Initialize the handler.
+        
+        Args:
+            placeholder: ``st.empty()`` element to write messages into
+        """
+        super().__init__(level=logging.WARNING)
+        self.placeholder = placeholder
+        # The Ollama logger is process-wide but each browser session runs in
+        # its own script thread; only mirror retries from this session's run
+        self.thread_id = threading.get_ident()
+    
+    def emit(self, record: logging.LogRecord):
+        """Show the latest retry message so a slow run doesn't look hung."""
+        if record.thread != self.thread_id:
+            return
+        self.placeholder.text(f"⏳ Ollama busy: {record.getMessage()}")
+
+
 def get_persona_inputs() -> List[str]:
     """
     Get dynamic persona inputs from user.
@@ -67,21 +111,33 @@ def get_persona_inputs() -> List[str]:
                 help=f"Provide detailed description of persona {i+1}"
             )
             
-            st.session_state[persona_key] = persona
+            if st.session_state[persona_key] != persona:
+                st.session_state[persona_key] = persona
             
-            if persona.strip():
-                personas.append(persona.strip())
+            stripped = persona.strip()
+            if stripped:
+                personas.append(stripped)
     
     return personas
 
 
-def validate_inputs(personas: List[str], product_description: str) -> Tuple[bool, str]:
+@st.cache_data(max_entries=8, show_spinner=False)
+def validate_inputs(
+    personas: Sequence[str], 
+    product_description: str, 
+    personas_stripped: bool = False
+) -> Tuple[bool, str]:
     """
     Validate user inputs.
     
+    Memoized so reruns triggered by unrelated widgets (or by each keystroke
+    elsewhere on the page) don't re-validate unchanged inputs.
+    
     Args:
         personas: List of persona descriptions
         product_description: Product/brand description
+        personas_stripped: Personas are already stripped and non-empty (as
+            returned by ``get_persona_inputs``), so skip re-checking each one
         
     Returns:
         Tuple of (is_valid, error_message)
@@ -89,25 +145,33 @@ def validate_inputs(personas: List[str], product_description: str) -> Tuple[bool
     if not personas:
         return False, "Please add at least one persona."
     
-    for i, persona in enumerate(personas):
-        if not persona.strip():
-            return False, f"Persona {i+1} is empty. Please provide a description."
+    if not personas_stripped:
+        for i, persona in enumerate(personas):
+            if not persona.strip():
+                return False, f"Persona {i+1} is empty. Please provide a description."
     
-    if not product_description.strip():
+    description_length = len(product_description.strip())
+    if not description_length:
         return False, "Please provide a product/brand description."
     
-    if len(product_description.strip()) < 20:
+    if description_length < 20:
         return False, "Product description should be at least 20 characters long."
     
     return True, ""
 
 
+@st.cache_data(ttl=30, show_spinner=False)
+def check_ollama_connection() -> bool:
+    """Probe the Ollama server at most once every 30 seconds across reruns."""
+    return test_ollama_connection()
+
+
 def display_connection_status():
     """Display Ollama connection status in sidebar."""
     st.sidebar.header("🔗 Connection Status")
     
     with st.spinner("Testing Ollama connection..."):
-        is_connected = test_ollama_connection()
+        is_connected = check_ollama_connection()
     
     if is_connected:
         st.sidebar.success("✅ Ollama connection active")
@@ -133,6 +197,7 @@ def main():
     
     # Display connection status
     display_connection_status()
+    start_prompt_warmup()
     
     # Get persona inputs
     personas = get_persona_inputs()
@@ -152,7 +217,7 @@ def main():
         )
         
         # Validation and submission
-        is_valid, error_message = validate_inputs(personas, product_description)
+        is_valid, error_message = validate_inputs(tuple(personas), product_description, personas_stripped=True)
         
         if error_message:
             st.error(error_message)
@@ -165,6 +230,9 @@ def main():
             use_container_width=True
         ):
             run_analysis(personas, product_description)
+        
+        if st.session_state.get('analysis_results'):
+            display_results(**st.session_state.analysis_results)
     
     with col2:
         st.header("ℹ️ How It Works")
@@ -201,56 +269,118 @@ def run_analysis(personas: List[str], product_description: str):
         personas: List of persona descriptions
         product_description: Product/brand description
     """
-    # Progress tracking
+    # Progress tracking; one status container batches the stage updates
     progress_bar = st.progress(0)
-    status_text = st.empty()
+    status = st.status(f"🎭 Generating {len(personas)} persona reactions in parallel...")
+    retry_handler = StatusLogHandler(status.empty())
+    ollama_logger.addHandler(retry_handler)
     
     try:
         # Step 1: Generate persona reactions
-        status_text.text("🎭 Generating persona reactions via Ollama...")
         progress_bar.progress(20)
-        
-        persona_reactions = []
-        for i, persona in enumerate(personas):
-            with st.spinner(f"Analyzing persona {i+1}/{len(personas)}..."):
-                reaction = generate_persona_reaction(persona, product_description)
-                persona_reactions.append(reaction)
-            
-            # Update progress
-            progress_step = 20 + (40 * (i + 1) / len(personas))
-            progress_bar.progress(int(progress_step))
+        persona_reactions = run_async(
+            cached_persona_reactions(personas, product_description)
+        )
+        progress_bar.progress(60)
         
         # Step 2: Run multi-agent analysis
-        status_text.text("🤖 Running multi-agent analysis...")
+        status.update(label="🤖 Running multi-agent analysis...")
         progress_bar.progress(70)
         
-        with st.spinner("Agents are working..."):
-            final_report = run_agent_analysis(personas, product_description, persona_reactions)
+        # Render the supervisor's report as it is generated, then hand the
+        # graph's final report (not the streamed text, which may end with an
+        # error report after a partial one) to the results tabs
+        live_report = st.empty()
+        report_state = {}
+        live_report.write_stream(
+            astream_agent_analysis(personas, product_description, persona_reactions, result=report_state)
+        )
+        live_report.empty()
+        final_report = report_state.get("final_report", "")
         
         progress_bar.progress(100)
-        status_text.text("✅ Analysis complete!")
-        
-        # Display results
-        display_results(personas, persona_reactions, final_report)
+        status.update(label="✅ Analysis complete!", state="complete")
         
-        # Update session state
+        # Update session state; results are rendered from here on every rerun
         st.session_state.last_analysis_time = time.strftime("%Y-%m-%d %H:%M:%S")
+        st.session_state.analysis_results = {
+            "personas": tuple(personas),
+            "persona_reactions": tuple(persona_reactions),
+            "final_report": final_report
+        }
         
     except Exception as e:
+        status.update(label="❌ Analysis failed", state="error")
         st.error(f"❌ Analysis failed: {str(e)}")
         st.error("Please check your Ollama server connection and try again.")
     
     finally:
         # Clean up progress indicators
-        time.sleep(1)
+        ollama_logger.removeHandler(retry_handler)
+        retry_handler.placeholder.empty()
         progress_bar.empty()
-        status_text.empty()
 
 
-def display_results(personas: List[str], persona_reactions: List[str], final_report: str):
+@st.cache_data(show_spinner=False)
+def build_json_export(
+    timestamp: str, 
+    personas: Tuple[str, ...], 
+    persona_reactions: Tuple[str, ...], 
+    final_report: str
+) -> str:
+    """
+    Serialize an analysis for the JSON download (memoized across reruns).
+    
+    Args:
+        timestamp: Time the analysis finished
+        personas: Original persona descriptions
+        persona_reactions: Generated persona reactions
+        final_report: Final synthesized report
+        
+    Returns:
+        Pretty-printed JSON document
+    """
+    export_data = {
+        "timestamp": timestamp,
+        "personas": list(personas),
+        "persona_reactions": list(persona_reactions),
+        "final_report": final_report
+    }
+    return json.dumps(export_data, indent=2)
+
+
+@st.cache_data(show_spinner=False)
+def build_csv_export(personas: Tuple[str, ...], persona_reactions: Tuple[str, ...]) -> str:
+    """
+    Serialize persona reactions for the CSV download (memoized across reruns).
+    
+    Args:
+        personas: Original persona descriptions
+        persona_reactions: Generated persona reactions
+        
+    Returns:
+        CSV document with a Persona,Reaction header
+    """
+    csv_buffer = io.StringIO()
+    # csv.writer quotes commas, quotes and newlines in LLM output correctly
+    csv_writer = csv.writer(csv_buffer)
+    csv_writer.writerow(["Persona", "Reaction"])
+    csv_writer.writerows(zip(personas, persona_reactions))
+    return csv_buffer.getvalue()
+
+
+@st.fragment
+def display_results(
+    personas: Tuple[str, ...], 
+    persona_reactions: Tuple[str, ...], 
+    final_report: str
+):
     """
     Display analysis results.
     
+    Runs as a fragment so interacting with the results (e.g. a download
+    button) reruns only this section, not the whole script.
+    
     Args:
         personas: Original persona descriptions
         persona_reactions: Generated persona reactions
@@ -287,17 +417,10 @@ def display_results(personas: List[str], persona_reactions: List[str], final_rep
     with tab3:
         st.markdown("### 💾 Export Options")
         
-        # Prepare full export data
-        export_data = {
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "personas": personas,
-            "persona_reactions": persona_reactions,
-            "final_report": final_report
-        }
-        
         # JSON export
-        import json
-        json_data = json.dumps(export_data, indent=2)
+        json_data = build_json_export(
+            st.session_state.get('last_analysis_time', ""), personas, persona_reactions, final_report
+        )
         
         st.download_button(
             label="📥 Download Full Analysis (JSON)",
@@ -307,18 +430,9 @@ def display_results(personas: List[str], persona_reactions: List[str], final_rep
         )
         
         # CSV export for personas
-        import io
-        csv_buffer = io.StringIO()
-        csv_buffer.write("Persona,Reaction\n")
-        for persona, reaction in zip(personas, persona_reactions):
-            # Escape CSV content
-            persona_clean = persona.replace('"', '""')
-            reaction_clean = reaction.replace('"', '""')
-            csv_buffer.write(f'"{persona_clean}","{reaction_clean}"\n')
-        
         st.download_button(
             label="📥 Download Persona Data (CSV)", 
-            data=csv_buffer.getvalue(),
+            data=build_csv_export(personas, persona_reactions),
             file_name=f"persona_reactions_{int(time.time())}.csv",
             mime="text/csv"
         )
@@ -1,16 +1,101 @@
 """Ollama API client for LLM interactions."""
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
+import asyncio
+import atexit
+import random
 import time
-import json
-from typing import List, Dict, Any
+import logging
+import orjson
+import weakref
+from functools import lru_cache
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Iterator, Optional, Tuple, TypeVar
 from dotenv import load_dotenv
 import os
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "deepseek-r1:14b")
+# Keep the model (and its prompt-prefix KV cache) resident between calls
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "1h")
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+# Maximum concurrent in-flight LLM requests per event loop
+LLM_PARALLEL = int(os.getenv("LLM_PARALLEL", "4"))
+# Attempts per async LLM request on connection errors, timeouts and overload
+ASYNC_MAX_RETRIES = 3
+# Statuses Ollama (or a proxy in front of it) returns while overloaded/restarting
+RETRYABLE_STATUS = (429, 503)
+# Upper bound on a server-requested Retry-After delay, in seconds
+RETRY_AFTER_MAX = 30
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Shared session so sync calls reuse keep-alive connections to Ollama
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+
+_llm_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def close() -> None:
+    """Close pooled connections held by the shared HTTP session and async clients."""
+    _SESSION.close()
+    
+    for loop, client in list(_async_clients.items()):
+        # Clients on a loop that is still running are closed by their owner
+        if not loop.is_closed() and not loop.is_running():
+            loop.run_until_complete(client.aclose())
+    _async_clients.clear()
+
+
+atexit.register(close)
+
+
+@lru_cache(maxsize=None)
+def _has_thinking_tokens(model: str) -> bool:
+    """Whether ``model`` emits ``<think>`` sections (cached per model name)."""
+    return "deepseek-r1" in model.lower()
+
+
+def _extract_after_thinking(content: str) -> str:
+    """Return the answer following deepseek-r1 thinking sections."""
+    # Everything after the last </think> is the answer, however many
+    # thinking sections precede it; rpartition finds it in one C-level scan.
+    # This doubles as the no-thinking fast path: keying on "<think>" instead
+    # would miss outputs whose chat template already emitted the opening tag
+    head, think_end, tail = content.rpartition("</think>")
+    if not think_end:
+        return content.strip()
+    
+    final_response = tail.strip()
+    if final_response:
+        return final_response
+    
+    # Only thinking, no answer: fall back to the thinking text itself
+    return head.replace("<think>", "").replace(think_end, "").strip()
+
+
+def _extract_plain(content: str) -> str:
+    """Return output from models without thinking tokens."""
+    return content.strip()
+
+
+@lru_cache(maxsize=None)
+def _extractor_for(model: str) -> Callable[[str], str]:
+    """Pick the response extractor for ``model`` once per model name."""
+    return _extract_after_thinking if _has_thinking_tokens(model) else _extract_plain
 
 
 def extract_final_response(content: str, model: str) -> str:
@@ -24,42 +109,165 @@ def extract_final_response(content: str, model: str) -> str:
     Returns:
         Cleaned response content
     """
-    # Handle deepseek-r1 models that generate thinking tokens
-    if "deepseek-r1" in model.lower():
-        # Look for the end of thinking tokens
-        think_end = "</think>"
-        if think_end in content:
-            # Extract everything after the </think> token
-            parts = content.split(think_end, 1)
-            if len(parts) > 1:
-                final_response = parts[1].strip()
-                # Return the final response if it's not empty
-                if final_response:
-                    return final_response
-            # Fallback: if no content after </think>, try to find content between last </think> and end
-            # This handles cases where there might be multiple thinking sections
-        
-        # Additional fallback: try to find content after <think> tags
-        think_start = "<think>"
-        if think_start in content and think_end in content:
-            # Find all thinking sections and get content after the last one
-            sections = content.split(think_end)
-            if len(sections) > 1:
-                final_response = sections[-1].strip()
-                if final_response:
-                    return final_response
-    
-    # For other models or if no thinking tokens found, return original content
-    return content.strip()
+    return _extractor_for(model)(content)
+
+
+def _llm_semaphore() -> asyncio.Semaphore:
+    """
+    Return the semaphore bounding concurrent LLM requests on the running loop.
+    
+    Each ``asyncio.run`` creates a new event loop, and a semaphore must not be
+    shared across loops, so one is kept per loop.
+    
+    Returns:
+        Semaphore allowing ``LLM_PARALLEL`` concurrent requests
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _llm_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _llm_semaphores[loop] = asyncio.Semaphore(LLM_PARALLEL)
+    return semaphore
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Return the async HTTP client shared by all requests on the running loop.
+    
+    Persona reactions, agents, warm-up and embedding calls reuse one
+    connection pool instead of opening a client per request. Connections are
+    bound to an event loop, so (like the semaphores) one client is kept per
+    loop.
+    
+    Returns:
+        Pooled client with a 240 s timeout
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _async_clients[loop] = httpx.AsyncClient(
+            timeout=240,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+        )
+    return client
+
+
+async def aclose_async_client() -> None:
+    """Close the running loop's shared client (call before the loop ends)."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def run_async(coro: Awaitable[T]) -> T:
+    """
+    Run a coroutine on a fresh event loop, then close that loop's client.
+    
+    Synchronous entry points use this instead of ``asyncio.run`` so pooled
+    connections don't outlive the loop they belong to.
+    
+    Args:
+        coro: Coroutine to run
+        
+    Returns:
+        The coroutine's result
+    """
+    async def main() -> T:
+        try:
+            return await coro
+        finally:
+            await aclose_async_client()
+    
+    return asyncio.run(main())
+
 
+class RetryableStatusError(Exception):
+    """Non-200 response that is worth retrying (server overloaded or restarting)."""
+    
+    def __init__(self, response: httpx.Response):
+        """
+        Initialize from the failed response.
+        
+        Args:
+            response: Response with a status in ``RETRYABLE_STATUS``
+        """
+        super().__init__(f"HTTP {response.status_code}: {response.text}")
+        self.retry_after: Optional[float] = None
+        try:
+            self.retry_after = min(float(response.headers["Retry-After"]), RETRY_AFTER_MAX)
+        except (KeyError, ValueError):
+            pass
+
+
+async def _aretry_or_raise(attempt: int, error: Exception) -> None:
+    """
+    Back off before the next async attempt, or give up after the last one.
+    
+    The sleep happens outside the concurrency semaphore so a retrying request
+    doesn't hold a slot other requests could use. Backoff is jittered so
+    requests that failed together (e.g. on an Ollama restart) don't retry in
+    lockstep; a server-provided Retry-After takes precedence.
+    
+    Args:
+        attempt: Zero-based index of the attempt that just failed
+        error: The transient error that caused the failure
+        
+    Raises:
+        Exception: If ``attempt`` was the final attempt
+    """
+    if attempt == ASYNC_MAX_RETRIES - 1:
+        raise Exception(f"Failed to connect to Ollama after {ASYNC_MAX_RETRIES} attempts: {str(error)}") from error
+    
+    delay = getattr(error, "retry_after", None)
+    if delay is None:
+        delay = min(0.5 * (2 ** attempt), 4) + random.uniform(0, 0.5)
+    logger.warning("Attempt %d/%d failed, retrying in %.1f seconds...", attempt + 1, ASYNC_MAX_RETRIES, delay)
+    await asyncio.sleep(delay)
 
-def chat_llm(messages: List[Dict[str, str]], model: str = DEFAULT_MODEL) -> str:
+
+def build_chat_payload(
+    messages: List[Dict[str, str]], 
+    model: str, 
+    stream: bool = False, 
+    **options: Any
+) -> Dict[str, Any]:
+    """
+    Build an ``/api/chat`` request body.
+    
+    Every request shares the same ``keep_alive`` and context size so Ollama
+    keeps the model loaded and can reuse the KV cache for repeated prompt
+    prefixes (e.g. the agents' constant system prompts).
+    
+    Args:
+        messages: List of message dictionaries with 'role' and 'content' keys
+        model: Model name to use
+        stream: Whether Ollama should stream the response
+        **options: Extra model options (e.g. ``num_predict``)
+        
+    Returns:
+        Request payload dictionary
+    """
+    return {
+        "model": model,
+        "messages": messages,
+        "stream": stream,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {"num_ctx": OLLAMA_NUM_CTX, **options}
+    }
+
+
+def chat_llm(
+    messages: List[Dict[str, str]], 
+    model: str = DEFAULT_MODEL, 
+    timeout: Tuple[float, float] = (5, 240)
+) -> str:
     """
     Send messages to Ollama LLM and return response.
     
     Args:
         messages: List of message dictionaries with 'role' and 'content' keys
         model: Model name to use (default: deepseek-r1:14b)
+        timeout: (connect, read) timeouts in seconds per attempt; fails fast
+            when Ollama is down but gives generation time to finish
         
     Returns:
         String response from the LLM (cleaned of thinking tokens for deepseek-r1)
@@ -69,61 +277,313 @@ def chat_llm(messages: List[Dict[str, str]], model: str = DEFAULT_MODEL) -> str:
     """
     url = f"{OLLAMA_BASE_URL}/api/chat"
     
-    payload = {
-        "model": model,
-        "messages": messages,
-        "stream": False
-    }
+    # Serialize once; retries resend the same bytes
+    body = orjson.dumps(build_chat_payload(messages, model))
     
-    # Exponential backoff configuration
-    max_retries = 10
+    # Exponential backoff configuration; sleeps total at most 1+2+4 s
+    max_retries = 4
     base_delay = 1
-    timeout = 240
     
     for attempt in range(max_retries):
         try:
-            response = requests.post(
+            response = _SESSION.post(
                 url,
-                json=payload,
+                data=body,
                 timeout=timeout,
-                headers={"Content-Type": "application/json"}
+                headers=JSON_HEADERS
             )
-            
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            error = e
+        else:
             if response.status_code == 200:
-                result = response.json()
+                result = orjson.loads(response.content)
                 raw_content = result.get("message", {}).get("content", "")
                 
                 # Extract final response, handling thinking tokens
                 final_content = extract_final_response(raw_content, model)
                 return final_content
-            else:
-                raise Exception(f"HTTP {response.status_code}: {response.text}")
-                
-        except requests.exceptions.RequestException as e:
-            if attempt == max_retries - 1:  # Last attempt
-                raise Exception(f"Failed to connect to Ollama after {max_retries} attempts: {str(e)}")
             
-            # Exponential backoff
-            delay = base_delay * (2 ** attempt)
-            print(f"Attempt {attempt + 1} failed, retrying in {delay} seconds...")
-            time.sleep(delay)
+            # Bad request, unknown model, etc. won't succeed on retry
+            if response.status_code not in RETRYABLE_STATUS:
+                raise Exception(f"HTTP {response.status_code}: {response.text}")
+            error = Exception(f"HTTP {response.status_code}: {response.text}")
+        
+        if attempt == max_retries - 1:  # Last attempt
+            raise Exception(f"Failed to connect to Ollama after {max_retries} attempts: {str(error)}") from error
+        
+        # Exponential backoff
+        delay = base_delay * (2 ** attempt)
+        logger.warning("Attempt %d/%d failed, retrying in %d seconds...", attempt + 1, max_retries, delay)
+        time.sleep(delay)
     
     raise Exception("Max retries exceeded")
 
 
-def generate_persona_reaction(persona: str, product_description: str, model: str = DEFAULT_MODEL) -> str:
+async def achat_llm(messages: List[Dict[str, str]], model: str = DEFAULT_MODEL) -> str:
     """
-    Generate a synthetic target-customer reaction for a given persona and product.
+    Async variant of ``chat_llm`` so concurrent agents can overlap their requests.
+    
+    Args:
+        messages: List of message dictionaries with 'role' and 'content' keys
+        model: Model name to use (default: deepseek-r1:14b)
+        
+    Returns:
+        String response from the LLM (cleaned of thinking tokens for deepseek-r1)
+        
+    Raises:
+        Exception: If the request fails after retries or returns a non-200 status
+    """
+    url = f"{OLLAMA_BASE_URL}/api/chat"
+    
+    body = orjson.dumps(build_chat_payload(messages, model))
+    
+    for attempt in range(ASYNC_MAX_RETRIES):
+        try:
+            async with _llm_semaphore():
+                response = await get_async_client().post(url, content=body, headers=JSON_HEADERS)
+            if response.status_code in RETRYABLE_STATUS:
+                raise RetryableStatusError(response)
+            break
+        except (httpx.TransportError, RetryableStatusError) as e:
+            await _aretry_or_raise(attempt, e)
+    
+    if response.status_code != 200:
+        raise Exception(f"HTTP {response.status_code}: {response.text}")
+    
+    result = orjson.loads(response.content)
+    raw_content = result.get("message", {}).get("content", "")
+    
+    return extract_final_response(raw_content, model)
+
+
+class ThinkingFilter:
+    """
+    Strip deepseek-r1 ``<think>`` sections from a stream of content deltas.
+    
+    Text from thinking models is held back until ``</think>`` has been seen,
+    then passed through unchanged. The opening tag is not a reliable signal:
+    chat templates often emit ``<think>`` themselves, so the model's output
+    starts mid-reasoning. Text is therefore held even without an opening
+    tag, but only up to ``MAX_HELD_CHARS``; past that the reply is treated
+    as having no thinking section and released in full. Once an explicit
+    ``<think>`` has been seen, thinking text is discarded as it arrives and
+    only a bounded tail is kept as a fallback for an unclosed section.
+    """
+    
+    # Most text held back at once, both while deciding whether the reply
+    # opens with thinking and as the fallback tail of an unclosed section
+    MAX_HELD_CHARS = 4096
+    
+    def __init__(self, model: str):
+        """
+        Initialize the filter.
+        
+        Args:
+            model: Model name to determine whether thinking tokens are expected
+        """
+        self._passthrough = not _has_thinking_tokens(model)
+        self._pending = ""
+        self._in_think = False
+        self._started = False
+    
+    def feed(self, delta: str) -> str:
+        """
+        Feed the next content delta.
+        
+        Args:
+            delta: Next piece of streamed content
+            
+        Returns:
+            Text that is safe to emit downstream (possibly empty)
+        """
+        if self._passthrough:
+            return self._emit(delta)
+        
+        think_end = "</think>"
+        # Only rescan the tail in case the marker straddles two deltas
+        search_from = max(0, len(self._pending) - len(think_end) + 1)
+        buffer = self._pending + delta
+        
+        idx = buffer.find(think_end, search_from)
+        if idx != -1:
+            text = buffer[idx + len(think_end):]
+            self._passthrough = True
+            self._pending = ""
+            return self._emit(text)
+        
+        if not self._in_think:
+            self._in_think = buffer.lstrip().startswith("<think>")
+        
+        if self._in_think:
+            # Inside an explicit thinking section: drop everything but a bounded tail
+            self._pending = buffer[-self.MAX_HELD_CHARS:]
+            return ""
+        
+        if len(buffer) > self.MAX_HELD_CHARS:
+            # Too long without </think> to be template-opened thinking: it's the answer
+            self._passthrough = True
+            self._pending = ""
+            return self._emit(buffer)
+        
+        self._pending = buffer
+        return ""
+    
+    def flush(self) -> str:
+        """
+        Release any held-back text once the stream has ended.
+        
+        Returns:
+            Remaining text, cleaned the same way as ``extract_final_response``
+        """
+        pending, self._pending = self._pending, ""
+        return _extract_after_thinking(pending) if pending else ""
+    
+    def _emit(self, text: str) -> str:
+        """Drop leading whitespace before the first emitted character."""
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+
+def chat_llm_stream(messages: List[Dict[str, str]], model: str = DEFAULT_MODEL) -> Iterator[str]:
+    """
+    Stream the LLM response token-by-token (synchronous).
+    
+    Args:
+        messages: List of message dictionaries with 'role' and 'content' keys
+        model: Model name to use (default: deepseek-r1:14b)
+        
+    Yields:
+        Content deltas as they arrive (thinking tokens removed for deepseek-r1)
+        
+    Raises:
+        Exception: If the request returns a non-200 status
+    """
+    url = f"{OLLAMA_BASE_URL}/api/chat"
+    
+    body = orjson.dumps(build_chat_payload(messages, model, stream=True))
+    
+    thinking_filter = ThinkingFilter(model)
+    
+    with _SESSION.post(url, data=body, headers=JSON_HEADERS, stream=True, timeout=240) as response:
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code}: {response.text}")
+        
+        for line in response.iter_lines():
+            if not line:
+                continue
+            
+            chunk = orjson.loads(line)
+            text = thinking_filter.feed(chunk.get("message", {}).get("content", ""))
+            if text:
+                yield text
+            
+            if chunk.get("done"):
+                break
+    
+    remainder = thinking_filter.flush()
+    if remainder:
+        yield remainder
+
+
+async def achat_llm_stream(
+    messages: List[Dict[str, str]], 
+    model: str = DEFAULT_MODEL
+) -> AsyncIterator[str]:
+    """
+    Stream the LLM response token-by-token.
+    
+    Args:
+        messages: List of message dictionaries with 'role' and 'content' keys
+        model: Model name to use (default: deepseek-r1:14b)
+        
+    Yields:
+        Content deltas as they arrive (thinking tokens removed for deepseek-r1)
+        
+    Raises:
+        Exception: If the request fails after retries or returns a non-200 status
+    """
+    url = f"{OLLAMA_BASE_URL}/api/chat"
+    
+    body = orjson.dumps(build_chat_payload(messages, model, stream=True))
+    
+    thinking_filter = ThinkingFilter(model)
+    
+    for attempt in range(ASYNC_MAX_RETRIES):
+        received = False
+        try:
+            async with _llm_semaphore():
+                async with get_async_client().stream("POST", url, content=body, headers=JSON_HEADERS) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        if response.status_code in RETRYABLE_STATUS:
+                            raise RetryableStatusError(response)
+                        raise Exception(f"HTTP {response.status_code}: {response.text}")
+                    
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        
+                        received = True
+                        chunk = orjson.loads(line)
+                        text = thinking_filter.feed(chunk.get("message", {}).get("content", ""))
+                        if text:
+                            yield text
+                        
+                        if chunk.get("done"):
+                            break
+            break
+        except (httpx.TransportError, RetryableStatusError) as e:
+            # Once output has been consumed the stream can't be replayed
+            if received:
+                raise
+            await _aretry_or_raise(attempt, e)
+    
+    remainder = thinking_filter.flush()
+    if remainder:
+        yield remainder
+
+
+async def awarm_prompt(system_prompt: str, model: str = DEFAULT_MODEL) -> bool:
+    """
+    Prefill a system prompt so later calls can reuse Ollama's prefix cache.
+    
+    Args:
+        system_prompt: System prompt to load into the KV cache
+        model: Model name to warm
+        
+    Returns:
+        True if Ollama accepted the warm-up request, False otherwise
+    """
+    payload = build_chat_payload(
+        [{"role": "system", "content": system_prompt}], 
+        model, 
+        num_predict=1
+    )
+    
+    try:
+        async with _llm_semaphore():
+            response = await get_async_client().post(
+                f"{OLLAMA_BASE_URL}/api/chat", content=orjson.dumps(payload), headers=JSON_HEADERS
+            )
+        return response.status_code == 200
+    except httpx.HTTPError:
+        return False
+
+
+def _persona_messages(persona: str, product_description: str) -> List[Dict[str, str]]:
+    """
+    Build the chat messages asking a persona to react to a product.
     
     Args:
         persona: Description of the target persona
         product_description: Description of the product/brand
-        model: Model to use for generation
         
     Returns:
-        Synthetic customer reaction as string (cleaned of thinking tokens)
+        Message list for ``chat_llm`` / ``achat_llm``
     """
-    messages = [
+    return [
         {
             "role": "system",
             "content": (
@@ -143,20 +603,59 @@ My reaction:
             """.strip()
         }
     ]
+
+
+def generate_persona_reaction(persona: str, product_description: str, model: str = DEFAULT_MODEL) -> str:
+    """
+    Generate a synthetic target-customer reaction for a given persona and product.
     
-    return chat_llm(messages, model)
+    Args:
+        persona: Description of the target persona
+        product_description: Description of the product/brand
+        model: Model to use for generation
+        
+    Returns:
+        Synthetic customer reaction as string (cleaned of thinking tokens)
+    """
+    return chat_llm(_persona_messages(persona, product_description), model)
+
+
+async def generate_persona_reactions_batch(
+    personas: List[str], 
+    product_description: str, 
+    model: str = DEFAULT_MODEL
+) -> List[str]:
+    """
+    Generate reactions for all personas concurrently.
+    
+    Requests overlap on the Ollama server (up to ``LLM_PARALLEL`` in flight),
+    so set ``OLLAMA_NUM_PARALLEL`` on the server to at least the same value.
+    
+    Args:
+        personas: List of persona descriptions
+        product_description: Description of the product/brand
+        model: Model to use for generation
+        
+    Returns:
+        Synthetic customer reactions, in the same order as ``personas``
+    """
+    return list(await asyncio.gather(*(
+        achat_llm(_persona_messages(persona, product_description), model)
+        for persona in personas
+    )))
 
 
 def test_ollama_connection() -> bool:
     """
     Test connection to Ollama server.
     
+    Uses the lightweight ``/api/tags`` endpoint so the check neither runs
+    inference nor loads the model.
+    
     Returns:
         True if connection successful, False otherwise
     """
     try:
-        test_messages = [{"role": "user", "content": "Hello, this is a connection test."}]
-        response = chat_llm(test_messages)
-        return len(response.strip()) > 0
-    except Exception:
+        return _SESSION.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=2).status_code == 200
+    except requests.exceptions.RequestException:
         return False 
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""Shared pytest fixtures and collection hooks."""
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+import ollama_client
+
+# (num_personas, persona texts) cases for test_get_persona_inputs,
+# emitted at collection time by pytest_generate_tests below.
+PERSONA_CASES = [
+    (0, []),
+    (1, ["Single persona description"]),
+    (3, [
+        "Persona 1: Tech-savvy millennial who loves gadgets",
+        "Persona 2: Budget-conscious student looking for value",
+        "Persona 3: Busy professional needing efficiency"
+    ]),
+    (10, [f"Persona {i+1}" for i in range(10)]),
+]
+
+
+def pytest_generate_tests(metafunc):
+    """Parametrize any test taking ``(n, personas)`` from PERSONA_CASES."""
+    if {"n", "personas"} <= set(metafunc.fixturenames):
+        metafunc.parametrize("n, personas", PERSONA_CASES, ids=[str(n) for n, _ in PERSONA_CASES])
+
+
+@pytest.fixture(autouse=True, scope="session")
+def single_ollama_session():
+    """Fail if a test reloads ollama_client and rebuilds the shared session in this worker."""
+    session = ollama_client._SESSION
+    yield
+    assert sys.modules["ollama_client"] is ollama_client
+    assert ollama_client._SESSION is session
+
+
+@pytest.fixture(scope="session")
+def sidebar_pool():
+    """One ``st.sidebar`` stand-in built per session instead of per test."""
+    sidebar = MagicMock()
+    # Build the child widget mocks up front; reset_mock() keeps them between tests
+    for widget in ("header", "subheader", "number_input", "text_area"):
+        getattr(sidebar, widget)
+    return sidebar
+
+
+@pytest.fixture
+def mock_sidebar(sidebar_pool, monkeypatch):
+    """Install the pooled sidebar on ``app.st`` with calls, return values and side effects cleared."""
+    sidebar_pool.reset_mock(return_value=True, side_effect=True)
+    monkeypatch.setattr("app.st.sidebar", sidebar_pool)
+    return sidebar_pool
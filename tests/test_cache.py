@@ -0,0 +1,157 @@
+"""Tests for agents/cache.py"""
+import pytest
+import threading
+from unittest.mock import patch
+import httpx
+import numpy as np
+import orjson
+from agents.cache import SemanticCache, cached_chat_llm, cached_persona_reactions, embed_text
+
+
+@pytest.fixture
+def semantic_cache(tmp_path):
+    """Fresh on-disk cache isolated to the test."""
+    cache = SemanticCache(directory=str(tmp_path), threshold=0.92)
+    with patch('agents.cache.get_cache', return_value=cache):
+        yield cache
+    cache.store.close()
+
+
+class TestSemanticCache:
+    """Test suite for the agent LLM response cache."""
+    
+    @pytest.mark.asyncio
+    @patch('agents.cache.embed_text', return_value=None)
+    @patch('agents.cache.achat_llm', return_value="fresh response")
+    async def test_exact_match_hit(self, mock_achat_llm, mock_embed, semantic_cache):
+        """Test that an identical prompt is served from the cache."""
+        messages = [
+            {"role": "system", "content": "You are BrandingExpert."},
+            {"role": "user", "content": "Product: ice cream"}
+        ]
+        
+        first = await cached_chat_llm(messages)
+        second = await cached_chat_llm(messages)
+        
+        assert first == second == "fresh response"
+        mock_achat_llm.assert_called_once()
+    
+    @pytest.mark.asyncio
+    @patch('agents.cache.achat_llm', return_value="fresh response")
+    async def test_semantic_hit_is_scoped_to_system_prompt(self, mock_achat_llm, semantic_cache):
+        """Test that near-identical prompts only hit within the same agent."""
+        embedding = np.array([1.0, 0.0], dtype=np.float32)
+        
+        with patch('agents.cache.embed_text', return_value=embedding) as mock_embed:
+            await cached_chat_llm([
+                {"role": "system", "content": "You are BrandingExpert."},
+                {"role": "user", "content": "Template\nProduct: ice cream"}
+            ], semantic_text="ice cream")
+            await cached_chat_llm([
+                {"role": "system", "content": "You are BrandingExpert."},
+                {"role": "user", "content": "Template\nProduct: ice cream!"}
+            ], semantic_text="ice cream!")
+            assert mock_achat_llm.call_count == 1
+            # Only the variable fields are embedded, not the template
+            mock_embed.assert_called_with("ice cream!")
+            
+            await cached_chat_llm([
+                {"role": "system", "content": "You are MarketingStrategist."},
+                {"role": "user", "content": "Template\nProduct: ice cream"}
+            ], semantic_text="ice cream")
+            assert mock_achat_llm.call_count == 2
+    
+    @pytest.mark.asyncio
+    @patch('agents.cache.achat_llm', return_value="fresh response")
+    async def test_exact_only_without_semantic_text(self, mock_achat_llm, semantic_cache):
+        """Test that prompts without semantic text never take a similarity hit."""
+        embedding = np.array([1.0, 0.0], dtype=np.float32)
+        
+        with patch('agents.cache.embed_text', return_value=embedding) as mock_embed:
+            for product in ("ice cream", "running shoes"):
+                await cached_chat_llm([
+                    {"role": "system", "content": "You are Supervisor."},
+                    {"role": "user", "content": f"Long constant template. Product: {product}"}
+                ])
+        
+        assert mock_achat_llm.call_count == 2
+        mock_embed.assert_not_called()
+    
+    def test_lookup_below_threshold(self, tmp_path):
+        """Test that dissimilar prompts miss the semantic index."""
+        cache = SemanticCache(directory=str(tmp_path), threshold=0.92)
+        cache.put("key", "cached", "namespace", np.array([1.0, 0.0], dtype=np.float32))
+        
+        assert cache.lookup("namespace", np.array([0.0, 1.0], dtype=np.float32)) is None
+        assert cache.lookup("namespace", np.array([1.0, 0.0], dtype=np.float32)) == "cached"
+        cache.store.close()
+    
+    def test_index_expires_with_ttl_and_is_bounded(self, tmp_path):
+        """Test that semantic rows expire with the store's TTL and respect the size bound."""
+        cache = SemanticCache(directory=str(tmp_path), threshold=0.92, ttl=60, max_entries=2)
+        x = np.array([1.0, 0.0], dtype=np.float32)
+        y = np.array([0.0, 1.0], dtype=np.float32)
+        
+        with patch('agents.cache.time.time', return_value=1000.0):
+            cache.put("old", "old response", "namespace", x)
+        with patch('agents.cache.time.time', return_value=1061.0):
+            assert cache.lookup("namespace", x) is None
+            cache.put("new", "new response", "namespace", y)
+            for i in range(3):
+                cache.put(f"key{i}", f"response {i}", "namespace", y)
+        
+        vectors, responses, _ = cache._index["namespace"]
+        assert responses == ["response 1", "response 2"]
+        assert vectors.shape == (2, 2)
+        cache.store.close()
+    
+    def test_concurrent_puts_keep_vectors_aligned(self, tmp_path):
+        """Test that index writes from several threads are neither lost nor misaligned."""
+        cache = SemanticCache(directory=str(tmp_path), threshold=0.92, max_entries=1000)
+        
+        def writer(thread_id):
+            for i in range(50):
+                vector = np.zeros(8, dtype=np.float32)
+                vector[thread_id] = 1.0
+                cache.put(f"{thread_id}-{i}", str(thread_id), "namespace", vector)
+        
+        threads = [threading.Thread(target=writer, args=(t,)) for t in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        vectors, responses, inserted = cache._index["namespace"]
+        assert len(responses) == len(inserted) == vectors.shape[0] == 400
+        assert [str(int(np.argmax(row))) for row in vectors] == responses
+        cache.store.close()
+    
+    @pytest.mark.asyncio
+    async def test_persona_reactions_only_dispatch_misses(self, semantic_cache):
+        """Test that unchanged personas reuse cached reactions."""
+        async def fake_batch(personas, product_description, model):
+            return [f"{persona} reacts" for persona in personas]
+        
+        with patch('agents.cache.generate_persona_reactions_batch', side_effect=fake_batch) as mock_batch:
+            await cached_persona_reactions(["Persona A", "Persona B"], "Ice cream")
+            reactions = await cached_persona_reactions(["Persona A", "Persona C"], "Ice cream")
+        
+        assert reactions == ["Persona A reacts", "Persona C reacts"]
+        assert mock_batch.call_args_list[1][0][0] == ["Persona C"]
+    
+    @pytest.mark.asyncio
+    async def test_embed_text_sends_orjson_body(self):
+        """Test that embeddings are requested with a pre-serialized body and normalized."""
+        requests_seen = []
+        
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(200, content=orjson.dumps({"embeddings": [[3.0, 4.0]]}))
+        
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with patch('agents.cache.get_async_client', return_value=client):
+                vector = await embed_text("ice cream", model="nomic-embed-text")
+        
+        assert orjson.loads(requests_seen[0].content) == {"model": "nomic-embed-text", "input": "ice cream"}
+        assert requests_seen[0].headers["content-type"] == "application/json"
+        assert np.allclose(vector, [0.6, 0.8])
@@ -1,6 +1,7 @@
 """Tests for agents/graph.py"""
 import pytest
-from unittest.mock import Mock, patch
+import asyncio
+from unittest.mock import AsyncMock, patch
 import json
 from agents.graph import create_agent_graph, AgentState
 
@@ -14,6 +15,7 @@ class TestAgentGraph:
             "personas": ["Persona 1", "Persona 2"],
             "product_description": "Test product",
             "persona_reactions": ["Reaction 1", "Reaction 2"],
+            "persona_block": "- Reaction 1\n- Reaction 2",
             "branding_output": {},
             "marketing_output": {},
             "product_output": {},
@@ -30,11 +32,12 @@ class TestAgentGraph:
         assert isinstance(state["trends_output"], dict)
         assert state["final_report"] == ""
     
-    @patch('agents.graph.chat_llm')
-    def test_branding_agent_node(self, mock_chat_llm):
+    @pytest.mark.asyncio
+    @patch('agents.graph.cached_chat_llm')
+    async def test_branding_agent_node(self, mock_cached_chat_llm):
         """Test branding agent node execution."""
         # Mock the chat_llm response
-        mock_chat_llm.return_value = json.dumps({
+        mock_cached_chat_llm.return_value = json.dumps({
             "branding_advice": [
                 "Improve color palette",
                 "Enhance logo design",
@@ -47,6 +50,7 @@ class TestAgentGraph:
             "personas": ["Tech-savvy millennial"],
             "product_description": "Innovative smartphone app",
             "persona_reactions": ["Excited about the features"],
+            "persona_block": "- Excited about the features",
             "branding_output": {},
             "marketing_output": {},
             "product_output": {},
@@ -56,18 +60,23 @@ class TestAgentGraph:
         
         # Import and test the actual branding agent
         from agents.graph import branding_agent
-        result = branding_agent(state)
+        result = await branding_agent(state)
         
         # Verify the function was called and returned expected structure
         assert isinstance(result, dict)
         assert "branding_output" in result
         assert isinstance(result["branding_output"], dict)
         assert "branding_advice" in result["branding_output"]
+        # Only the product and persona block are embedded for the semantic cache
+        assert mock_cached_chat_llm.call_args[1]["semantic_text"] == (
+            "Innovative smartphone app\n- Excited about the features"
+        )
     
-    @patch('agents.graph.chat_llm')
-    def test_marketing_agent_node(self, mock_chat_llm):
+    @pytest.mark.asyncio
+    @patch('agents.graph.cached_chat_llm')
+    async def test_marketing_agent_node(self, mock_cached_chat_llm):
         """Test marketing agent node execution."""
-        mock_chat_llm.return_value = json.dumps({
+        mock_cached_chat_llm.return_value = json.dumps({
             "marketing_plan": ["Social media campaign", "Influencer partnerships"],
             "pricing_tips": ["Premium pricing strategy", "Bundle offers"]
         })
@@ -76,6 +85,7 @@ class TestAgentGraph:
             "personas": ["Budget-conscious student"],
             "product_description": "Affordable meal planning app",
             "persona_reactions": ["Interested but price-sensitive"],
+            "persona_block": "- Interested but price-sensitive",
             "branding_output": {},
             "marketing_output": {},
             "product_output": {},
@@ -84,16 +94,17 @@ class TestAgentGraph:
         }
         
         from agents.graph import marketing_agent
-        result = marketing_agent(state)
+        result = await marketing_agent(state)
         
         assert isinstance(result, dict)
         assert "marketing_output" in result
         assert isinstance(result["marketing_output"], dict)
     
-    @patch('agents.graph.chat_llm')
-    def test_product_agent_node(self, mock_chat_llm):
+    @pytest.mark.asyncio
+    @patch('agents.graph.cached_chat_llm')
+    async def test_product_agent_node(self, mock_cached_chat_llm):
         """Test product agent node execution."""
-        mock_chat_llm.return_value = json.dumps({
+        mock_cached_chat_llm.return_value = json.dumps({
             "feature_gaps": ["Missing offline mode", "Need better onboarding"],
             "quick_wins": ["Add dark mode", "Improve search functionality"]
         })
@@ -102,6 +113,7 @@ class TestAgentGraph:
             "personas": ["Power user"],
             "product_description": "Productivity software",
             "persona_reactions": ["Wants more advanced features"],
+            "persona_block": "- Wants more advanced features",
             "branding_output": {},
             "marketing_output": {},
             "product_output": {},
@@ -110,15 +122,16 @@ class TestAgentGraph:
         }
         
         from agents.graph import product_agent
-        result = product_agent(state)
+        result = await product_agent(state)
         
         assert isinstance(result, dict)
         assert "product_output" in result
         assert isinstance(result["product_output"], dict)
     
-    @patch('agents.graph.search_recent_trends')
-    @patch('agents.graph.chat_llm')
-    def test_trends_agent_node(self, mock_chat_llm, mock_search_trends):
+    @pytest.mark.asyncio
+    @patch('agents.tools.asearch_recent_trends')
+    @patch('agents.graph.cached_chat_llm')
+    async def test_trends_agent_node(self, mock_cached_chat_llm, mock_search_trends):
         """Test online trends agent node execution."""
         mock_search_trends.return_value = [
             "TikTok marketing is trending",
@@ -126,7 +139,7 @@ class TestAgentGraph:
             "AI integration becoming standard"
         ]
         
-        mock_chat_llm.return_value = json.dumps({
+        mock_cached_chat_llm.return_value = json.dumps({
             "trends": [
                 "TikTok marketing is trending",
                 "Sustainability focus increasing",
@@ -138,6 +151,7 @@ class TestAgentGraph:
             "personas": ["Gen Z consumer"],
             "product_description": "Eco-friendly fashion brand",
             "persona_reactions": ["Loves sustainable options"],
+            "persona_block": "- Loves sustainable options",
             "branding_output": {},
             "marketing_output": {},
             "product_output": {},
@@ -146,17 +160,18 @@ class TestAgentGraph:
         }
         
         from agents.graph import trends_agent
-        result = trends_agent(state)
+        result = await trends_agent(state)
         
         assert isinstance(result, dict)
         assert "trends_output" in result
         assert isinstance(result["trends_output"], dict)
     
-    @patch('agents.graph.chat_llm')
-    def test_supervisor_agent_merge_logic(self, mock_chat_llm):
+    @pytest.mark.asyncio
+    @patch('agents.graph.cached_chat_llm')
+    async def test_supervisor_agent_merge_logic(self, mock_cached_chat_llm):
         """Test supervisor agent aggregation logic."""
         # Mock supervisor to return a comprehensive report
-        mock_chat_llm.return_value = """
+        mock_cached_chat_llm.return_value = """
 # Executive Summary
 Comprehensive analysis completed for all personas.
 
@@ -182,6 +197,7 @@ Comprehensive analysis completed for all personas.
             "personas": ["Persona 1", "Persona 2"],
             "product_description": "Test product",
             "persona_reactions": ["Reaction 1", "Reaction 2"],
+            "persona_block": "- Reaction 1\n- Reaction 2",
             "branding_output": {"branding_advice": ["advice1", "advice2"]},
             "marketing_output": {"marketing_plan": ["plan1"], "pricing_tips": ["tip1"]},
             "product_output": {"feature_gaps": ["gap1"], "quick_wins": ["win1"]},
@@ -190,7 +206,7 @@ Comprehensive analysis completed for all personas.
         }
         
         from agents.graph import supervisor_agent
-        result = supervisor_agent(state)
+        result = await supervisor_agent(state)
         
         assert isinstance(result, dict)
         assert "final_report" in result
@@ -208,4 +224,239 @@ Comprehensive analysis completed for all personas.
         
         # Test that we can compile the graph
         compiled_graph = graph.compile()
-        assert compiled_graph is not None 
\ No newline at end of file
+        assert compiled_graph is not None
+    
+    def test_fan_out_agents_targets_all_specialists(self):
+        """Test that the dispatcher fans out to every specialist agent."""
+        from agents.graph import fan_out_agents, SPECIALIST_AGENTS
+        
+        state = {
+            "personas": ["Persona 1"],
+            "product_description": "Test product",
+            "persona_reactions": ["Reaction 1"],
+            "persona_block": "- Reaction 1",
+            "branding_output": {},
+            "marketing_output": {},
+            "product_output": {},
+            "trends_output": {},
+            "final_report": ""
+        }
+        
+        sends = fan_out_agents(state)
+        
+        assert [send.node for send in sends] == list(SPECIALIST_AGENTS)
+        assert all(send.arg == state for send in sends)
+    
+    def test_dispatch_agents_builds_persona_block(self):
+        """Test that the dispatcher builds the shared persona reaction block."""
+        from agents.graph import dispatch_agents
+        
+        result = dispatch_agents({"persona_reactions": ["Reaction 1", "Reaction 2"]})
+        
+        assert result == {"persona_block": "- Reaction 1\n- Reaction 2"}
+    
+    @pytest.mark.asyncio
+    async def test_supervisor_agent_streams_report(self):
+        """Test that the supervisor forwards report chunks to the stream writer."""
+        async def fake_cached_chat_llm(messages, on_chunk=None, **kwargs):
+            for chunk in ["# Executive ", "Summary"]:
+                on_chunk(chunk)
+            return "# Executive Summary"
+        
+        state = {
+            "personas": ["Persona 1"],
+            "product_description": "Test product",
+            "persona_reactions": ["Reaction 1"],
+            "persona_block": "- Reaction 1",
+            "branding_output": {},
+            "marketing_output": {},
+            "product_output": {},
+            "trends_output": {},
+            "final_report": ""
+        }
+        streamed = []
+        
+        from agents.graph import supervisor_agent
+        with patch('agents.graph.cached_chat_llm', side_effect=fake_cached_chat_llm):
+            result = await supervisor_agent(state, writer=streamed.append)
+        
+        assert streamed == ["# Executive ", "Summary"]
+        assert result["final_report"] == "# Executive Summary"
+    
+    @pytest.mark.asyncio
+    async def test_astream_agent_analysis_reports_final_state(self):
+        """Test that a report failing midway is taken from the graph state, not the stream."""
+        async def failing_cached_chat_llm(messages, on_chunk=None, **kwargs):
+            if on_chunk is None:
+                return json.dumps({"trends": []})
+            on_chunk("# Half a rep")
+            raise RuntimeError("stream dropped")
+        
+        from agents.graph import astream_agent_analysis
+        result = {}
+        with patch('agents.graph.cached_chat_llm', side_effect=failing_cached_chat_llm), \
+             patch('agents.graph.asyncio.sleep', new_callable=AsyncMock), \
+             patch('agents.tools.asearch_recent_trends', new_callable=AsyncMock, return_value=[]):
+            streamed = [chunk async for chunk in astream_agent_analysis(
+                ["Persona 1"], "Test product", ["Reaction 1"], result=result
+            )]
+        
+        assert streamed[0] == "# Half a rep"
+        assert result["final_report"].startswith("# Creative Agency Analysis Report")
+        assert "stream dropped" in result["final_report"]
+        assert "# Half a rep" not in result["final_report"]
+    
+    @pytest.mark.asyncio
+    @patch('agents.graph.cached_chat_llm')
+    async def test_analysis_agent_splits_sections(self, mock_cached_chat_llm):
+        """Test that the combined analysis agent fills all three outputs."""
+        mock_cached_chat_llm.return_value = json.dumps({
+            "branding": {"branding_advice": ["Bolder packaging"]},
+            "marketing": {"marketing_plan": ["Gym partnerships"], "pricing_tips": ["Intro bundle"]},
+            "product": {"feature_gaps": ["Dairy-free option"], "quick_wins": ["Single-serve cups"]}
+        })
+        
+        state = {
+            "personas": ["Fitness enthusiast"],
+            "product_description": "High-protein ice cream",
+            "persona_reactions": ["Loves the macros"],
+            "persona_block": "- Loves the macros",
+            "branding_output": {},
+            "marketing_output": {},
+            "product_output": {},
+            "trends_output": {},
+            "final_report": ""
+        }
+        
+        from agents.graph import analysis_agent
+        result = await analysis_agent(state)
+        
+        mock_cached_chat_llm.assert_called_once()
+        assert result["branding_output"] == {"branding_advice": ["Bolder packaging"]}
+        assert result["marketing_output"]["pricing_tips"] == ["Intro bundle"]
+        assert result["product_output"]["quick_wins"] == ["Single-serve cups"]
+    
+    def test_create_agent_graph_modes(self):
+        """Test the combined and per-specialist graph layouts."""
+        combined_nodes = set(create_agent_graph(combined=True).nodes)
+        separate_nodes = set(create_agent_graph(combined=False).nodes)
+        
+        assert {"analysis", "trends", "supervisor"} <= combined_nodes
+        assert not {"branding", "marketing", "product"} & combined_nodes
+        assert {"branding", "marketing", "product", "trends", "supervisor"} <= separate_nodes
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("combined", [True, False], ids=["combined", "specialists"])
+    async def test_warm_agent_prompts_follow_layout(self, combined):
+        """Test that only the system prompts of the active layout are warmed."""
+        from agents.graph import awarm_agent_prompts
+        from agents.prompts import (
+            SYSTEM_BRANDING_AGENT, SYSTEM_MARKETING_AGENT, SYSTEM_PRODUCT_AGENT,
+            SYSTEM_ANALYSIS_AGENT, SYSTEM_ONLINE_TRENDS_AGENT, SYSTEM_SUPERVISOR
+        )
+        
+        with patch('agents.graph.awarm_prompt', new_callable=AsyncMock, return_value=True) as mock_warm:
+            await awarm_agent_prompts(combined=combined)
+        
+        warmed = [call[0][0] for call in mock_warm.call_args_list]
+        if combined:
+            expected = [SYSTEM_ANALYSIS_AGENT, SYSTEM_ONLINE_TRENDS_AGENT, SYSTEM_SUPERVISOR]
+        else:
+            expected = [
+                SYSTEM_BRANDING_AGENT, SYSTEM_MARKETING_AGENT, SYSTEM_PRODUCT_AGENT,
+                SYSTEM_ONLINE_TRENDS_AGENT, SYSTEM_SUPERVISOR
+            ]
+        assert warmed == expected
+    
+    def test_safe_parse_fallbacks(self):
+        """Test JSON parsing and line-based fallbacks of agent responses."""
+        from agents.graph import _safe_parse
+        
+        assert _safe_parse('{"quick_wins": ["Dark mode"]}', keys=("quick_wins",)) == {"quick_wins": ["Dark mode"]}
+        
+        response = "Launch on TikTok\n\n  Partner with gyms  \nIntro price $4.99\nBundle three pints"
+        result = _safe_parse(response, keys=("marketing_plan", "pricing_tips"))
+        assert result == {
+            "marketing_plan": ["Launch on TikTok", "Partner with gyms"],
+            "pricing_tips": ["Intro price $4.99", "Bundle three pints"]
+        }
+        
+        empty = _safe_parse("   ", keys=("feature_gaps", "quick_wins"), placeholders=("No gaps", "No wins"))
+        assert empty == {"feature_gaps": ["No gaps"], "quick_wins": ["No wins"]}
+        
+        limited = _safe_parse("\n".join(f"Advice {i}" for i in range(8)), keys=("branding_advice",), limit=5)
+        assert len(limited["branding_advice"]) == 5
+        
+        # Baseline split: the first key gets the floor half, so one line goes to the second
+        assert _safe_parse("Only tip", keys=("marketing_plan", "pricing_tips")) == {
+            "marketing_plan": [], "pricing_tips": ["Only tip"]
+        }
+        odd = _safe_parse("Gap 1\nGap 2\nWin 1", keys=("feature_gaps", "quick_wins"))
+        assert odd == {"feature_gaps": ["Gap 1"], "quick_wins": ["Gap 2", "Win 1"]}
+        
+        # Stray JSON lines are only dropped where the branding baseline dropped them
+        assert _safe_parse("{broken\nTip", keys=("marketing_plan", "pricing_tips")) == {
+            "marketing_plan": ["{broken"], "pricing_tips": ["Tip"]
+        }
+        assert _safe_parse("{broken\nAdvice", keys=("branding_advice",), skip_json_lines=True) == {
+            "branding_advice": ["Advice"]
+        }
+    
+    @pytest.mark.asyncio
+    async def test_specialist_agents_run_concurrently(self):
+        """Test that the fan-out runs all four specialists at the same time."""
+        real_sleep = asyncio.sleep
+        in_flight = 0
+        peak = 0
+        
+        async def fake_cached_chat_llm(messages, on_chunk=None, **kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await real_sleep(0.01)
+            in_flight -= 1
+            return "# Report" if on_chunk else "{}"
+        
+        from agents.graph import _initial_state
+        graph = create_agent_graph(combined=False).compile()
+        state = _initial_state(["Persona 1"], "Test product", ["Reaction 1"])
+        
+        with patch('agents.graph.asyncio.sleep', new=AsyncMock()), \
+                patch('agents.graph.cached_chat_llm', side_effect=fake_cached_chat_llm), \
+                patch('agents.tools.asearch_recent_trends', new=AsyncMock(return_value=["Trend"])):
+            result = await graph.ainvoke(state)
+        
+        assert peak == 4
+        assert result["final_report"] == "# Report"
+    
+    def test_run_agent_analysis_reuses_compiled_graph(self):
+        """Test that each analysis runs the graph compiled at import time."""
+        import agents.graph as graph_module
+        
+        with patch.object(graph_module, 'create_agent_graph', side_effect=AssertionError("rebuilt graph")), \
+                patch.object(graph_module._COMPILED_GRAPH, 'ainvoke',
+                             new=AsyncMock(return_value={"final_report": "# Report"})) as mock_ainvoke:
+            first = graph_module.run_agent_analysis(["Persona 1"], "Test product", ["Reaction 1"])
+            second = graph_module.run_agent_analysis(["Persona 1"], "Test product", ["Reaction 1"])
+        
+        assert first == second == "# Report"
+        assert mock_ainvoke.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_parallel_agent_outputs_merge(self):
+        """Test that agents in the same parallel step can update the same output."""
+        from langgraph.graph import StateGraph, END
+        from langgraph.types import Send
+        
+        graph = StateGraph(AgentState)
+        graph.add_node("start", lambda state: {})
+        graph.add_node("first", lambda state: {"trends_output": {"trends": ["A"]}})
+        graph.add_node("second", lambda state: {"trends_output": {"sources": ["B"]}})
+        graph.set_entry_point("start")
+        graph.add_conditional_edges("start", lambda state: [Send("first", state), Send("second", state)])
+        graph.add_edge("first", END)
+        graph.add_edge("second", END)
+        
+        result = await graph.compile().ainvoke({"trends_output": {}})
+        
+        assert result["trends_output"] == {"trends": ["A"], "sources": ["B"]}
@@ -0,0 +1,47 @@
+"""Tests for agents/json_stream.py"""
+from agents.json_stream import JSONObjectScanner, extract_first_json_object
+
+
+class TestJSONStream:
+    """Test suite for incremental JSON object extraction."""
+    
+    def test_extract_bare_json(self):
+        """Test that bare JSON output is parsed directly."""
+        result = extract_first_json_object('{"branding_advice": ["Bolder colours"]}')
+        assert result == {"branding_advice": ["Bolder colours"]}
+    
+    def test_extract_json_wrapped_in_chatter(self):
+        """Test extracting JSON surrounded by prose and code fences."""
+        response = """
+        Here is my analysis:
+        ```json
+        {"marketing_plan": ["Launch on TikTok"], "pricing_tips": ["Bundle {3} pints"]}
+        ```
+        Let me know if you need more.
+        """
+        
+        result = extract_first_json_object(response)
+        assert result == {"marketing_plan": ["Launch on TikTok"], "pricing_tips": ["Bundle {3} pints"]}
+    
+    def test_skips_brace_prose_before_json(self):
+        """Test that balanced non-JSON braces are skipped."""
+        response = 'Format: {feature_gaps:list} -> {"feature_gaps": ["Offline mode"]}'
+        
+        result = extract_first_json_object(response)
+        assert result == {"feature_gaps": ["Offline mode"]}
+    
+    def test_no_json_returns_none(self):
+        """Test that plain text and truncated objects yield None."""
+        assert extract_first_json_object("Just some advice.\nNo JSON here.") is None
+        assert extract_first_json_object('{"trends": ["cut off') is None
+    
+    def test_scanner_handles_chunk_boundaries(self):
+        """Test feeding an object split across streamed chunks."""
+        scanner = JSONObjectScanner()
+        chunks = ['Sure! {"trends": ["#prote', 'inSnack \\"viral\\" }"', ']', '} trailing text']
+        
+        results = [scanner.feed(chunk) for chunk in chunks]
+        
+        assert results[:3] == [None, None, None]
+        assert results[3] == {"trends": ['#proteinSnack "viral" }']}
+        assert scanner.done
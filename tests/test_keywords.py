@@ -0,0 +1,30 @@
+"""Tests for agents/keywords.py"""
+from agents.keywords import top_keywords
+
+
+class TestKeywords:
+    """Test suite for search keyword extraction."""
+    
+    def test_top_keywords_whole_words(self):
+        """Test that keywords are whole, de-duplicated words from the description."""
+        description = (
+            "PowerSpoon Protein Ice Cream delivers 20 g whey protein per serving, "
+            "supporting muscle recovery. Low sugar ice cream for fitness fans."
+        )
+        
+        keywords = top_keywords(description)
+        words = keywords.split()
+        
+        assert "Cream" in words
+        assert len(words) == len(set(words))
+        assert all(word in description for word in words)
+    
+    def test_top_keywords_is_cached(self):
+        """Test that repeated descriptions hit the LRU cache."""
+        top_keywords.cache_clear()
+        description = "Eco-friendly fashion brand with recycled fabrics and transparent sourcing."
+        
+        top_keywords(description)
+        top_keywords(description)
+        
+        assert top_keywords.cache_info().hits == 1
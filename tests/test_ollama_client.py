@@ -1,17 +1,48 @@
 """Tests for ollama_client.py"""
 import pytest
+import asyncio
 from unittest.mock import Mock, patch
 import json
-from ollama_client import chat_llm, extract_final_response
+import orjson
+import requests
+from ollama_client import (
+    chat_llm, achat_llm, chat_llm_stream, extract_final_response, ThinkingFilter,
+    generate_persona_reactions_batch
+)
+import ollama_client
+
+
+class FakeResponse:
+    """Minimal stand-in for ``requests.Response``."""
+    __slots__ = ("status_code", "content", "text")
+    
+    def __init__(self, payload, status_code=200):
+        self.status_code = status_code
+        self.content = orjson.dumps(payload)
+        self.text = self.content.decode()
+
+
+class FakePost:
+    """Callable replacing ``Session.post`` that records calls and replays one outcome."""
+    __slots__ = ("outcome", "calls")
+    
+    def __init__(self, outcome):
+        self.outcome = outcome
+        self.calls = []
+    
+    def __call__(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return self.outcome
 
 
 class TestOllamaClient:
     """Test suite for Ollama client functionality."""
     
-    def test_extract_final_response_deepseek_r1(self):
-        """Test extracting final response from deepseek-r1 model with thinking tokens."""
-        # Test case with thinking tokens
-        content_with_thinking = """
+    @pytest.mark.parametrize("content, model, expected", [
+        pytest.param(
+            """
         <think>
         This is the model thinking about the problem.
         Let me analyze the user's request...
@@ -19,65 +50,88 @@ class TestOllamaClient:
         </think>
         
         This is the final response that should be returned.
-        """
-        
-        result = extract_final_response(content_with_thinking, "deepseek-r1:14b")
-        assert result == "This is the final response that should be returned."
-        
-        # Test case without thinking tokens
-        content_without_thinking = "This is a direct response without thinking."
-        result = extract_final_response(content_without_thinking, "deepseek-r1:14b")
-        assert result == "This is a direct response without thinking."
-        
-        # Test case with multiple thinking sections
-        content_multiple_thinking = """
+        """,
+            "deepseek-r1:14b",
+            "This is the final response that should be returned.",
+            id="deepseek_thinking"
+        ),
+        pytest.param(
+            "This is a direct response without thinking.",
+            "deepseek-r1:14b",
+            "This is a direct response without thinking.",
+            id="deepseek_no_thinking"
+        ),
+        pytest.param(
+            """
         <think>First thinking section</think>
         Some intermediate content
         <think>Second thinking section</think>
         Final response after all thinking.
-        """
-        
-        result = extract_final_response(content_multiple_thinking, "deepseek-r1:14b")
-        assert result == "Final response after all thinking."
+        """,
+            "deepseek-r1:14b",
+            "Final response after all thinking.",
+            id="deepseek_multiple_thinking"
+        ),
+        pytest.param(
+            "Regular response from other model", "llama2:7b",
+            "Regular response from other model", id="llama2_unchanged"
+        ),
+        pytest.param(
+            "Regular response from other model", "mistral:7b",
+            "Regular response from other model", id="mistral_unchanged"
+        ),
+        pytest.param("", "deepseek-r1:14b", "", id="empty"),
+        pytest.param(
+            "<think>Only thinking, no response</think>", "deepseek-r1:14b",
+            "Only thinking, no response", id="only_thinking_fallback"
+        ),
+        pytest.param(
+            "<think>Thinking without closing tag", "deepseek-r1:14b",
+            "<think>Thinking without closing tag", id="malformed_unclosed"
+        ),
+    ])
+    def test_extract_final_response(self, content, model, expected):
+        """Test extracting the final response across models and thinking layouts."""
+        assert extract_final_response(content, model) == expected
+    
+    @pytest.mark.parametrize("model", ["llama2:7b", "mistral:7b", "phi3:mini", "gemma:2b"])
+    def test_extract_final_response_other_models(self, model):
+        """Test that non-thinking models dispatch to the plain extractor and keep their output."""
+        assert ollama_client._extractor_for(model) is ollama_client._extract_plain
+        assert extract_final_response("<think>kept</think> Answer", model) == "<think>kept</think> Answer"
+    
+    @pytest.mark.parametrize("model", ["deepseek-r1:14b", "deepseek-r1:7b", "DeepSeek-R1:32b"])
+    def test_extractor_for_thinking_models(self, model):
+        """Test that deepseek-r1 variants dispatch to the thinking extractor."""
+        assert ollama_client._extractor_for(model) is ollama_client._extract_after_thinking
     
-    def test_extract_final_response_other_models(self):
-        """Test that other models return content unchanged."""
-        content = "Regular response from other model"
+    def test_extract_final_response_fast_paths(self):
+        """Test that outputs without thinking skip the thinking extractor's work."""
+        ollama_client._extractor_for.cache_clear()
+        assert ollama_client._extractor_for("llama2:7b") is ollama_client._extract_plain
         
-        result = extract_final_response(content, "llama2:7b")
-        assert result == "Regular response from other model"
+        # Only the plain extractor keeps think tags, so this catches misdispatch
+        result = extract_final_response("  <think>kept</think> Regular response  ", "llama2:7b")
+        assert result == "<think>kept</think> Regular response"
         
-        result = extract_final_response(content, "mistral:7b")
-        assert result == "Regular response from other model"
+        # Opening tag already emitted by the chat template, only </think> in the output
+        assert extract_final_response("reasoning</think>\nAnswer", "deepseek-r1:14b") == "Answer"
     
-    def test_extract_final_response_edge_cases(self):
-        """Test edge cases for response extraction."""
-        # Empty content
-        result = extract_final_response("", "deepseek-r1:14b")
-        assert result == ""
+    def test_extract_final_response_pathological_nesting(self):
+        """Test that deeply nested thinking tags are handled in a single pass."""
+        nested = "<think>" * 10_000 + "reasoning" + "</think>" * 10_000
         
-        # Only thinking tokens, no final response
-        content_only_thinking = "<think>Only thinking, no response</think>"
-        result = extract_final_response(content_only_thinking, "deepseek-r1:14b")
-        assert result == "Only thinking, no response"  # Fallback to original
-        
-        # Malformed thinking tokens
-        content_malformed = "<think>Thinking without closing tag"
-        result = extract_final_response(content_malformed, "deepseek-r1:14b")
-        assert result == "<think>Thinking without closing tag"
+        assert extract_final_response(nested + "\nAnswer", "deepseek-r1:14b") == "Answer"
+        assert extract_final_response(nested, "deepseek-r1:14b") == "reasoning"
     
-    @patch('requests.post')
-    def test_chat_llm_success(self, mock_post):
+    def test_chat_llm_success(self, monkeypatch):
         """Test successful LLM chat interaction."""
-        # Mock response
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
+        fake_post = FakePost(FakeResponse({
             "message": {
                 "content": "This is a test response from the LLM."
             }
-        }
-        mock_post.return_value = mock_response
+        }))
+        monkeypatch.setattr(ollama_client._SESSION, "post", fake_post)
         
         # Test input
         messages = [
@@ -92,28 +146,25 @@ class TestOllamaClient:
         assert result == "This is a test response from the LLM."
         
         # Verify the request was made correctly
-        mock_post.assert_called_once()
-        call_args = mock_post.call_args
-        assert call_args[0][0] == "http://localhost:11434/api/chat"
+        assert len(fake_post.calls) == 1
+        url, kwargs = fake_post.calls[0]
+        assert url == "http://localhost:11434/api/chat"
         
         # Verify request payload structure
-        payload = call_args[1]['json']
+        payload = json.loads(kwargs['data'])
         assert payload['model'] == "deepseek-r1:14b"
         assert payload['messages'] == messages
         assert payload['stream'] is False
+        assert payload['keep_alive'] == "1h"
+        assert payload['options']['num_ctx'] == 4096
     
-    @patch('requests.post')
-    def test_chat_llm_with_thinking_tokens(self, mock_post):
+    def test_chat_llm_with_thinking_tokens(self, monkeypatch):
         """Test LLM chat with deepseek-r1 thinking tokens."""
-        # Mock response with thinking tokens
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
+        monkeypatch.setattr(ollama_client._SESSION, "post", FakePost(FakeResponse({
             "message": {
                 "content": "<think>Let me think about this...</think>\n\nThis is the actual response."
             }
-        }
-        mock_post.return_value = mock_response
+        })))
         
         messages = [{"role": "user", "content": "Test with thinking"}]
         result = chat_llm(messages, model="deepseek-r1:14b")
@@ -121,48 +172,358 @@ class TestOllamaClient:
         # Should return only the content after </think>
         assert result == "This is the actual response."
     
-    @patch('requests.post')
-    def test_chat_llm_timeout_handling(self, mock_post):
-        """Test timeout handling in LLM chat."""
-        # Mock timeout exception
-        mock_post.side_effect = Exception("Connection timeout")
+    @patch('ollama_client.time.sleep')
+    def test_chat_llm_timeout_handling(self, mock_sleep, monkeypatch):
+        """Test that read timeouts are retried, then surfaced as the cause."""
+        fake_post = FakePost(requests.exceptions.ReadTimeout("Read timed out"))
+        monkeypatch.setattr(ollama_client._SESSION, "post", fake_post)
+        
+        messages = [{"role": "user", "content": "test"}]
+        
+        with pytest.raises(Exception) as exc_info:
+            chat_llm(messages, timeout=(3.05, 120))
+        
+        assert isinstance(exc_info.value.__cause__, requests.exceptions.ReadTimeout)
+        assert len(fake_post.calls) == 4
+        assert all(kwargs["timeout"] == (3.05, 120) for _, kwargs in fake_post.calls)
+    
+    @pytest.mark.parametrize("model, expected", [
+        pytest.param(None, "deepseek-r1:14b", id="default"),
+        pytest.param("custom-model", "custom-model", id="custom"),
+    ])
+    def test_chat_llm_model_parameter(self, monkeypatch, model, expected):
+        """Test that the default or given model is sent to Ollama."""
+        fake_post = FakePost(FakeResponse({"message": {"content": "response"}}))
+        monkeypatch.setattr(ollama_client._SESSION, "post", fake_post)
         
         messages = [{"role": "user", "content": "test"}]
+        if model is None:
+            chat_llm(messages)  # No model specified, should use default
+        else:
+            chat_llm(messages, model=model)
         
-        # Should handle exception gracefully
-        with pytest.raises(Exception):
-            chat_llm(messages)
+        payload = json.loads(fake_post.calls[0][1]['data'])
+        assert payload['model'] == expected
     
-    @patch('requests.post')
-    def test_chat_llm_default_model(self, mock_post):
-        """Test default model parameter."""
+    @pytest.mark.asyncio
+    @patch('httpx.AsyncClient.post')
+    async def test_achat_llm_success(self, mock_post):
+        """Test successful async LLM chat interaction."""
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "message": {"content": "response"}
-        }
+        mock_response.content = json.dumps({
+            "message": {
+                "content": "<think>Reasoning...</think>\n\nAsync response."
+            }
+        }).encode()
         mock_post.return_value = mock_response
         
-        messages = [{"role": "user", "content": "test"}]
-        chat_llm(messages)  # No model specified, should use default
+        messages = [{"role": "user", "content": "Hello, async test"}]
+        result = await achat_llm(messages, model="deepseek-r1:14b")
         
-        # Verify default model was used
-        payload = mock_post.call_args[1]['json']
+        assert result == "Async response."
+        mock_post.assert_called_once()
+        assert mock_post.call_args[0][0] == "http://localhost:11434/api/chat"
+        payload = json.loads(mock_post.call_args[1]['content'])
         assert payload['model'] == "deepseek-r1:14b"
+        assert payload['messages'] == messages
+    
+    def test_thinking_filter_streams_after_think_end(self):
+        """Test that streamed thinking tokens are held back until </think>."""
+        thinking_filter = ThinkingFilter("deepseek-r1:14b")
+        chunks = ["<thi", "nk>Consider {braces}</th", "ink>\n\n{\"trends\":", " []}"]
+        
+        emitted = [thinking_filter.feed(chunk) for chunk in chunks]
+        
+        assert emitted == ["", "", '{"trends":', " []}"]
+        assert thinking_filter.flush() == ""
+    
+    def test_thinking_filter_passthrough(self):
+        """Test that non-thinking models stream through immediately."""
+        other_filter = ThinkingFilter("llama2:7b")
+        assert other_filter.feed("  <think>kept</think>") == "<think>kept</think>"
+        assert other_filter.feed(" answer") == " answer"
+    
+    def test_thinking_filter_without_opening_tag(self):
+        """Test that reasoning is withheld when the chat template emitted <think>."""
+        thinking_filter = ThinkingFilter("deepseek-r1:14b")
+        chunks = ["Okay, the user wants", " {json} stuff", "</think>\n\n", '{"a":1}']
+        
+        emitted = "".join(thinking_filter.feed(chunk) for chunk in chunks) + thinking_filter.flush()
+        
+        assert emitted == '{"a":1}' == extract_final_response("".join(chunks), "deepseek-r1:14b")
     
-    @patch('requests.post')
-    def test_chat_llm_custom_model(self, mock_post):
-        """Test custom model parameter."""
+    def test_thinking_filter_matches_extract_final_response(self):
+        """Test that streaming "reasoning</think>\nAnswer" yields the same answer as the batch path."""
+        thinking_filter = ThinkingFilter("deepseek-r1:14b")
+        
+        emitted = [thinking_filter.feed(chunk) for chunk in ["reason", "ing</thi", "nk>\nAns", "wer"]]
+        
+        assert emitted == ["", "", "Ans", "wer"]
+        assert thinking_filter.flush() == ""
+    
+    def test_thinking_filter_keeps_long_reply_without_think_tags(self):
+        """Test that a long thinking-model reply without think tags comes through whole."""
+        thinking_filter = ThinkingFilter("deepseek-r1:14b")
+        reply = "".join(f"- Recommendation {i}: keep the packaging bold\n" for i in range(300))
+        assert len(reply) > 2 * ThinkingFilter.MAX_HELD_CHARS
+        chunks = [reply[i:i + 100] for i in range(0, len(reply), 100)]
+        
+        emitted = [thinking_filter.feed(chunk) for chunk in chunks]
+        
+        # Released once the hold limit is passed, not only when the stream ends
+        assert any(emitted[:len(chunks) // 2])
+        streamed = "".join(emitted) + thinking_filter.flush()
+        # Streaming can't strip trailing whitespace it has already emitted
+        assert streamed.rstrip() == extract_final_response(reply, "deepseek-r1:14b")
+    
+    def test_thinking_filter_releases_unthinking_response_on_flush(self):
+        """Test that a thinking model's reply without </think> is released when the stream ends."""
+        thinking_filter = ThinkingFilter("deepseek-r1:14b")
+        
+        assert thinking_filter.feed("  Direct") == ""
+        assert thinking_filter.feed(" answer") == ""
+        assert thinking_filter.flush() == "Direct answer"
+    
+    @pytest.mark.asyncio
+    async def test_achat_llm_bounds_concurrency(self):
+        """Test that concurrent async calls respect LLM_PARALLEL."""
+        in_flight = 0
+        peak = 0
+        
+        async def slow_post(*args, **kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            response = Mock(status_code=200)
+            response.content = json.dumps({"message": {"content": "ok"}}).encode()
+            return response
+        
+        messages = [{"role": "user", "content": "test"}]
+        with patch('ollama_client.LLM_PARALLEL', 2), patch('httpx.AsyncClient.post', side_effect=slow_post):
+            results = await asyncio.gather(*(achat_llm(messages) for _ in range(6)))
+        
+        assert results == ["ok"] * 6
+        assert peak == 2
+    
+    @pytest.mark.asyncio
+    @patch('ollama_client.asyncio.sleep')
+    @patch('httpx.AsyncClient.post')
+    async def test_achat_llm_retries_transient_errors(self, mock_post, mock_sleep):
+        """Test that async calls retry connection errors before succeeding."""
+        import httpx
+        
         mock_response = Mock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "message": {"content": "response"}
-        }
+        mock_response.content = json.dumps({"message": {"content": "recovered"}}).encode()
+        mock_post.side_effect = [httpx.ConnectError("connection reset"), mock_response]
+        
+        result = await achat_llm([{"role": "user", "content": "test"}], model="llama2:7b")
+        
+        assert result == "recovered"
+        assert mock_post.call_count == 2
+        mock_sleep.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    @patch('ollama_client.asyncio.sleep')
+    @patch('httpx.AsyncClient.post')
+    async def test_achat_llm_chains_final_transport_error(self, mock_post, mock_sleep):
+        """Test that the give-up error keeps the last transport error as its cause."""
+        import httpx
+        
+        mock_post.side_effect = httpx.ConnectError("connection refused")
+        
+        with pytest.raises(Exception, match="after 3 attempts") as exc_info:
+            await achat_llm([{"role": "user", "content": "test"}], model="llama2:7b")
+        
+        assert isinstance(exc_info.value.__cause__, httpx.ConnectError)
+        assert mock_post.call_count == 3
+    
+    @pytest.mark.asyncio
+    async def test_generate_persona_reactions_batch_runs_concurrently(self):
+        """Test that persona reactions overlap and keep persona order."""
+        in_flight = 0
+        peak = 0
+        
+        async def fake_achat_llm(messages, model):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return f"reaction to: {messages[1]['content'].splitlines()[0]}"
+        
+        with patch('ollama_client.achat_llm', side_effect=fake_achat_llm):
+            reactions = await generate_persona_reactions_batch(
+                ["Persona A", "Persona B", "Persona C"], "Test product", model="llama2:7b"
+            )
+        
+        assert reactions == [
+            "reaction to: I am: Persona A",
+            "reaction to: I am: Persona B",
+            "reaction to: I am: Persona C",
+        ]
+        assert peak == 3
+    
+    @patch('ollama_client._SESSION.get')
+    def test_ollama_connection_uses_tags_endpoint(self, mock_get):
+        """Test that the health check hits /api/tags instead of running inference."""
+        mock_get.return_value = Mock(status_code=200)
+        
+        assert ollama_client.test_ollama_connection() is True
+        assert mock_get.call_args[0][0].endswith("/api/tags")
+        
+        mock_get.side_effect = requests.exceptions.ConnectionError("refused")
+        assert ollama_client.test_ollama_connection() is False
+    
+    @patch('ollama_client._SESSION.post')
+    def test_chat_llm_stream_strips_thinking(self, mock_post):
+        """Test that the sync stream yields deltas with thinking removed."""
+        lines = [
+            {"message": {"content": "<think>plan"}, "done": False},
+            {"message": {"content": "ning</think>Hello"}, "done": False},
+            {"message": {"content": " world"}, "done": True},
+        ]
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.iter_lines.return_value = [json.dumps(line).encode() for line in lines]
+        mock_post.return_value.__enter__ = Mock(return_value=mock_response)
+        mock_post.return_value.__exit__ = Mock(return_value=False)
+        
+        chunks = list(chat_llm_stream([{"role": "user", "content": "test"}], model="deepseek-r1:14b"))
+        
+        assert "".join(chunks) == "Hello world"
+        assert json.loads(mock_post.call_args[1]["data"])["stream"] is True
+    
+    @pytest.mark.asyncio
+    @patch('ollama_client.asyncio.sleep')
+    @patch('httpx.AsyncClient.post')
+    async def test_achat_llm_honors_retry_after(self, mock_post, mock_sleep):
+        """Test that overload responses are retried after the server-given delay."""
+        import httpx
+        
+        overloaded = httpx.Response(503, headers={"Retry-After": "2"}, text="busy")
+        ok = httpx.Response(200, json={"message": {"content": "done"}})
+        mock_post.side_effect = [overloaded, ok]
+        
+        result = await achat_llm([{"role": "user", "content": "test"}], model="llama2:7b")
+        
+        assert result == "done"
+        mock_sleep.assert_awaited_once_with(2.0)
+    
+    @patch('ollama_client.time.sleep')
+    @patch('ollama_client._SESSION.post')
+    def test_chat_llm_retry_classification(self, mock_post, mock_sleep):
+        """Test that client errors fail fast while overload is retried."""
+        mock_post.return_value = Mock(status_code=404, text="model not found")
+        with pytest.raises(Exception, match="HTTP 404"):
+            chat_llm([{"role": "user", "content": "test"}])
+        assert mock_post.call_count == 1
+        
+        mock_post.reset_mock()
+        mock_post.return_value = Mock(status_code=503, text="busy")
+        with pytest.raises(Exception, match="after 4 attempts"):
+            chat_llm([{"role": "user", "content": "test"}])
+        assert mock_post.call_count == 4
+        assert [c[0][0] for c in mock_sleep.call_args_list] == [1, 2, 4]
+    
+    def test_thinking_filter_bounds_held_text(self):
+        """Test that long thinking traces are discarded instead of buffered."""
+        thinking_filter = ThinkingFilter("deepseek-r1:14b")
+        
+        assert thinking_filter.feed("<think>") == ""
+        for _ in range(1000):
+            assert thinking_filter.feed("reasoning " * 10) == ""
+            assert len(thinking_filter._pending) <= ThinkingFilter.MAX_HELD_CHARS
+        
+        assert thinking_filter.feed("done</thi") == ""
+        assert thinking_filter.feed("nk>\n\nThe answer") == "The answer"
+        assert thinking_filter.feed(" continues") == " continues"
+    
+    def test_async_client_shared_per_loop(self):
+        """Test that requests on one loop share a client that run_async closes."""
+        async def clients():
+            return ollama_client.get_async_client(), ollama_client.get_async_client()
+        
+        first, second = ollama_client.run_async(clients())
+        
+        assert first is second
+        assert first.is_closed
+        
+        other, _ = ollama_client.run_async(clients())
+        assert other is not first
+    
+    @patch('ollama_client._SESSION.post')
+    def test_chat_llm_reuses_module_session(self, mock_post):
+        """Test that repeated calls share one pooled requests.Session."""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.content = json.dumps({"message": {"content": "ok"}}).encode()
         mock_post.return_value = mock_response
         
-        messages = [{"role": "user", "content": "test"}]
-        result = chat_llm(messages, model="custom-model")
+        session = ollama_client._SESSION
+        chat_llm([{"role": "user", "content": "first"}])
+        chat_llm([{"role": "user", "content": "second"}])
+        
+        assert isinstance(session, requests.Session)
+        assert ollama_client._SESSION is session
+        assert mock_post.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_achat_llm_gathers_over_shared_client(self):
+        """Test that N gathered calls overlap on the loop's shared client."""
+        import httpx
+        
+        in_flight = 0
+        peak = 0
+        
+        async def handler(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            prompt = json.loads(request.content)["messages"][0]["content"]
+            return httpx.Response(200, json={"message": {"content": f"reply to {prompt}"}})
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with patch('ollama_client.get_async_client', return_value=client):
+            results = await asyncio.gather(*(
+                achat_llm([{"role": "user", "content": f"persona {i}"}], model="llama2:7b")
+                for i in range(10)
+            ))
+        await client.aclose()
+        
+        assert results == [f"reply to persona {i}" for i in range(10)]
+        assert peak == ollama_client.LLM_PARALLEL
+    
+    @pytest.mark.asyncio
+    async def test_achat_llm_stream_untagged_thinking_model_reply(self):
+        """Test that a long deepseek-r1 reply without think tags streams whole and early."""
+        import httpx
+        
+        reply = "".join(f"- Recommendation {i}: keep the packaging bold\n" for i in range(300))
+        deltas = [reply[i:i + 100] for i in range(0, len(reply), 100)]
+        sent = 0
+        
+        async def ndjson():
+            nonlocal sent
+            for delta in deltas:
+                sent += 1
+                yield orjson.dumps({"message": {"content": delta}, "done": False}) + b"\n"
+            yield orjson.dumps({"message": {"content": ""}, "done": True}) + b"\n"
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=ndjson())))
+        received_at = []
+        chunks = []
+        with patch('ollama_client.get_async_client', return_value=client):
+            async for chunk in ollama_client.achat_llm_stream([{"role": "user", "content": "report"}], model="deepseek-r1:14b"):
+                received_at.append(sent)
+                chunks.append(chunk)
+        await client.aclose()
         
-        # Verify custom model was used
-        payload = mock_post.call_args[1]['json']
-        assert payload['model'] == "custom-model" 
\ No newline at end of file
+        assert "".join(chunks).rstrip() == reply.rstrip()
+        # Output starts well before the last delta has been sent
+        assert received_at[0] < len(deltas) // 2